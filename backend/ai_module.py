@@ -1,13 +1,32 @@
 import cv2
 import csv
-import numpy as np
-from ultralytics import YOLO
+import time
+from occupancy import SlotOccupancy
+from inference import (BATCH_SIZE, TILE_SIZE, RoiDetector, ThroughputMeter, layout_tiles,
+                       measure_batch_sizes, predict_boxes, predict_tiled, read_batches,
+                       read_gated_batches)
+from motion import MotionGate
+from tracker import OccupancyTracker
+from sources import FrameSampler, open_video
+from detectors import load_detector
 
 CSV_PATH = "slots.csv"
-MODEL_PATH = "best.pt"
+MODEL_PATH = None  # None 이면 감지 백엔드(DETECTOR_BACKEND)별 기본 경로 (best.pt / best.onnx ...)
 
 CONFIDENCE = 0.25
 IMGSZ = 1280
+# 점유 판정 규칙: "center" | "iou" | "overlap" (임계값 None이면 규칙별 기본값)
+OCCUPANCY_RULE = "center"
+OCCUPANCY_THRESHOLD = None
+# 변화가 없는 프레임은 YOLO 를 건너뛰고 이전 결과 재사용
+USE_MOTION_GATE = True
+# 바뀐 슬롯 주변 영역만 잘라서 재감지 (움직임 게이트 포함)
+USE_ROI_RECHECK = False
+# 고해상도 영상: 슬롯 배치 영역을 겹치는 타일로 나눠 원본 해상도로 추론 (타일 간 NMS 로 합침)
+USE_TILED_INFERENCE = False
+PROGRESS_EVERY = 30  # 진행률 콜백 간격 (프레임)
+# 긴 녹화본: N초마다 한 장만 분석 (None 이면 모든 프레임, 건너뛰는 프레임은 디코딩 비용도 줄임)
+SAMPLE_EVERY_SEC = None
 
 def load_slots(csv_path):
     slots = []
@@ -24,26 +43,22 @@ def load_slots(csv_path):
         print(f"오류: {csv_path} 파일을 찾을 수 없습니다.")
         return []
 
-def is_car_center_in_slot(car_box, slot_points):
-    x1, y1, x2, y2 = car_box
-    car_center_x = int((x1 + x2) / 2)
-    car_center_y = int((y1 + y2) / 2)
-    car_center = (car_center_x, car_center_y)
-    
-    slot_cnt = np.array(slot_points, dtype=np.int32)
-    result = cv2.pointPolygonTest(slot_cnt, car_center, False)
-    return result >= 0
-
-def analyze_parking_video(video_path):
-    print(f"AI 분석 시작: {video_path}")
+def analyze_parking_video(video_path, batch_size=BATCH_SIZE, motion_gate=USE_MOTION_GATE,
+                          roi_recheck=USE_ROI_RECHECK, tiled=USE_TILED_INFERENCE, progress=None,
+                          sample_every_sec=SAMPLE_EVERY_SEC):
+    """progress: progress(처리한 프레임 수, 전체 프레임 수) 콜백 (작업 큐 진행률 표시용)
+    sample_every_sec: 이 간격(초)마다 한 프레임만 분석"""
+    print(f"AI 분석 시작: {video_path} (batch={batch_size})")
     
     slots = load_slots(CSV_PATH)
     if not slots:
         print("슬롯 정보가 없습니다.")
         return {}
 
-    model = YOLO(MODEL_PATH)
-    cap = cv2.VideoCapture(video_path)
+    slot_engine = SlotOccupancy(slots, rule=OCCUPANCY_RULE, threshold=OCCUPANCY_THRESHOLD)
+    model = load_detector(path=MODEL_PATH)
+    # 업로드가 아직 진행 중이면 앞부분부터 읽으면서 분석
+    cap = open_video(video_path)
     
     if not cap.isOpened():
         print("영상을 열 수 없습니다.")
@@ -53,47 +68,103 @@ def analyze_parking_video(video_path):
 
     total_car_count = 0
     frame_count = 0
+    sampled_count = 0  # 실제로 읽은(분석한) 프레임 수
+    meter = ThroughputMeter(batch_size)
+
+    car_boxes = None
+    occupied = None
+    roi_detector = None
+    # 감지 결과가 N번 연속 같아야 슬롯 상태를 바꾸는 상태 머신 (깜빡임 방지 + 회전/주차 시간 통계)
+    tracker = OccupancyTracker(len(slots))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    sampler = FrameSampler.every_seconds(cap, sample_every_sec)
+    step = sampler.step
+    tiles = None
+    if tiled:
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        tiles = layout_tiles(slot_engine.bboxes, frame_shape)
+        print(f"타일 추론: 프레임당 {len(tiles)}개 타일 ({TILE_SIZE}px)")
+
+    if roi_recheck:
+        # 바뀐 슬롯 주변만 잘라서 재감지 (잘라낸 영역끼리 한 번에 추론, 주기적으로 전체 프레임 감지)
+        gate = MotionGate(slots)
+        roi_detector = RoiDetector(model, slot_engine, gate, IMGSZ, CONFIDENCE)
+        for frame_count, frame in sampler:
+            sampled_count += 1
+
+            t0 = time.perf_counter()
+            car_boxes, occupied, mode = roi_detector.update(frame)
+            if mode != "skip":
+                meter.add(1, time.perf_counter() - t0)
+                tracker.update(occupied, frame_count / fps)
+                if tracker.pending.any():
+                    gate.force_next(tracker.pending)
+            total_car_count += len(car_boxes)
+            if progress is not None and sampled_count % PROGRESS_EVERY == 0:
+                progress(frame_count, total_frames)
+    else:
+        # 움직임 게이트: 슬롯 영역에 변화가 있는 프레임만 감지 대상으로 모음
+        if motion_gate:
+            gate = MotionGate(slots)
+            batches = read_gated_batches(sampler, gate, batch_size)
+        else:
+            gate = None
+            batches = (list(zip(indices, frames))
+                       for indices, frames in read_batches(sampler, batch_size))
+
+        # batch_size 장씩 모아서 predict 한 번에 추론, 결과는 프레임 순서대로 처리
+        for batch in batches:
+            frames = [frame for _, frame in batch if frame is not None]
+            t0 = time.perf_counter()
+            if tiles is not None:
+                boxes_per_frame = iter(predict_tiled(model, frames, tiles, TILE_SIZE, CONFIDENCE))
+            else:
+                boxes_per_frame = iter(predict_boxes(model, frames, IMGSZ, CONFIDENCE))
+            if frames:
+                meter.add(len(frames), time.perf_counter() - t0)
+
+            for frame_index, frame in batch:
+                frame_count = frame_index
+                sampled_count += 1
+                if frame is not None:
+                    car_boxes = next(boxes_per_frame)
+                    # 현재 프레임의 슬롯 점유 상태 확인 (전체 슬롯 x 차량 한 번에)
+                    occupied = slot_engine.occupancy(car_boxes)
+                    tracker.update(occupied, frame_index / fps)
+                    # 확정 대기 중인 슬롯이 있으면 다음 프레임부터 다시 감지 (max_skip 까지 기다리지 않음)
+                    if gate is not None and tracker.pending.any():
+                        gate.force_next(tracker.pending)
+                # 감지를 건너뛴 프레임은 직전 감지 결과를 그대로 사용
+            
+                total_car_count += len(car_boxes)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_count += 1
-
-        results = model.predict(frame, imgsz=IMGSZ, conf=CONFIDENCE, classes=[0], verbose=False)
-        
-        car_boxes = []
-        current_car_count = 0
-
-        for r in results:
-            boxes_list = r.boxes.xyxy.tolist()
-            current_car_count += len(boxes_list)
+            if progress is not None:
+                progress(frame_count, total_frames)
 
-            for box in boxes_list:
-                x1, y1, x2, y2 = map(int, box)
-                car_boxes.append((x1, y1, x2, y2))
-
-        # 현재 프레임의 슬롯 점유 상태 확인
-        for idx, slot in enumerate(slots):
-            slot_id = idx + 1 # 슬롯 ID는 1부터 시작
-            is_occupied = False
-            
-            for car in car_boxes:
-                if is_car_center_in_slot(car, slot):
-                    is_occupied = True
-                    break
-            
-            final_status[slot_id] = is_occupied
-        
-        total_car_count += current_car_count
+    # 마지막 프레임 한 장이 아니라 확정된 상태를 결과로 사용
+    if occupied is not None:
+        final_status = {idx + 1: bool(o) for idx, o in enumerate(tracker.state)} # 슬롯 ID는 1부터 시작
 
     cap.release()
+    if progress is not None:
+        progress(frame_count, max(total_frames, frame_count))
+    stats = meter.summary()
     print("분석 종료")
+    print(f"추론 처리량: {stats['fps']} fps (batch={batch_size}, 배치당 {stats['batch_ms']} ms)")
+    if gate is not None:
+        stats["motion"] = gate.summary()
+        print(f"움직임 게이트: 분석한 {sampled_count} 프레임 중 {gate.skipped} 프레임 감지 생략")
+    if roi_detector is not None:
+        stats["roi"] = dict(roi_detector.counts)
+    if tiles is not None:
+        stats["tiles_per_frame"] = len(tiles)
+    stats["sample_step"] = step
+    stats["sampled_frames"] = sampled_count
     
     avg_car_count = 0
-    if frame_count > 0:
-        avg_car_count = int(total_car_count / frame_count)
+    if sampled_count > 0:
+        avg_car_count = int(total_car_count / sampled_count)
     
     vehicle_counts = {
         "car": avg_car_count
@@ -102,5 +173,22 @@ def analyze_parking_video(video_path):
     return {
         "spaces": final_status,
         "vehicles": vehicle_counts,
-        "slots": {idx+1: slot for idx, slot in enumerate(slots)}
-    }
\ No newline at end of file
+        "slots": {idx+1: slot for idx, slot in enumerate(slots)},
+        "slot_stats": tracker.slot_stats(frame_count / fps),
+        "turnovers": int(tracker.turnovers.sum()),
+        "stats": stats
+    }
+
+
+# 배치 크기별 추론 처리량 비교: python ai_module.py [영상 경로] [프레임 수]
+if __name__ == "__main__":
+    import sys
+    video = sys.argv[1] if len(sys.argv) > 1 else "../videos/test02.mp4"
+    n_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    cap = cv2.VideoCapture(video)
+    sample = next(read_batches(cap, n_frames), ([], []))[1]
+    cap.release()
+
+    for row in measure_batch_sizes(load_detector(path=MODEL_PATH), sample, IMGSZ, CONFIDENCE):
+        print(f"batch={row['batch_size']:>3}  {row['fps']:>7} fps  배치당 {row['batch_ms']} ms")
\ No newline at end of file
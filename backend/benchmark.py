@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import cv2
+import numpy as np
+from occupancy import OCCUPANCY_RULES, SlotOccupancy
+from overlay import SlotOverlay
+from encoder import JpegEncoder
+from inference import BATCH_SIZE, predict_boxes
+from sources import FrameSampler
+from detectors import _Result, load_detector
+
+VIDEO_PATH = "../videos/test02.mp4"
+SLOT_COUNTS = (100, 1000, 10000)   # 합성 슬롯 배치 크기
+BOX_COUNTS = (10, 100, 1000)       # 프레임당 차량 박스 수
+REPEATS = 20                       # 단계별 반복 측정 횟수 (앞에 1회 워밍업)
+DECODE_FRAMES = 300                # 디코딩 측정에 쓰는 앞쪽 프레임 수
+DECODE_STEPS = (1, 24)             # 매 프레임 / 1초마다 (24fps 기준) 샘플링
+INFER_FRAMES = 32                  # 추론 / 인코딩 측정에 쓰는 프레임 수
+OVERLAY_FLIP_RATIO = 0.05          # 그리기 측정 시 프레임마다 상태가 바뀌는 슬롯 비율
+# "stub" 이면 모델 없이 고정 박스를 돌려주는 감지기, 그 외는 감지 백엔드 이름 (ultralytics / onnx / openvino)
+BENCH_DETECTOR = os.environ.get("BENCH_DETECTOR", "stub")
+SEED = 0
+
+
+class StubDetector:
+    """벤치마크용 감지기: 모델 없이 미리 정한 박스를 ultralytics 결과 형식으로 돌려줌
+    점유 계산 / 그리기 / 인코딩을 모델 속도와 분리해서 재고, 추론 단계에서는
+    predict_boxes 의 결과 변환 비용만 남는다."""
+
+    def __init__(self, boxes):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ones(len(self.boxes), dtype=np.float32)
+
+    def predict(self, source, imgsz=None, conf=0.25, classes=None, verbose=False, **kwargs):
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        return [_Result(self.boxes, self.conf) for _ in frames]
+
+
+def synthetic_slots(n, frame_shape, seed=SEED):
+    """프레임을 격자로 나눠 칸마다 살짝 찌그러진 사각형 슬롯 하나 (load_slots 와 같은 형식)"""
+    h, w = frame_shape[:2]
+    cols = max(1, math.ceil(math.sqrt(n * w / h)))
+    rows = math.ceil(n / cols)
+    cell = np.array([w / cols, h / rows])
+    base = np.array([[0.1, 0.1], [0.9, 0.1], [0.9, 0.9], [0.1, 0.9]])
+    rng = np.random.default_rng(seed)
+
+    slots = []
+    for i in range(n):
+        r, c = divmod(i, cols)
+        corners = (base + rng.uniform(-0.08, 0.08, (4, 2))) * cell + cell * (c, r)
+        slots.append([tuple(p) for p in corners.round().astype(int).tolist()])
+    return slots
+
+
+def synthetic_boxes(slots, n, frame_shape, seed=SEED):
+    """차량 박스 n 개: 80% 는 임의의 슬롯 위 (슬롯 크기 정도), 나머지는 프레임 아무 곳 -> (n, 4) float32"""
+    h, w = frame_shape[:2]
+    rng = np.random.default_rng(seed + n)
+    polys = np.array(slots, dtype=np.float32)
+    lo, hi = polys.min(axis=1), polys.max(axis=1)
+    size = (hi - lo).mean(axis=0)
+
+    on_slot = int(n * 0.8)
+    picked = rng.choice(len(slots), size=on_slot, replace=on_slot > len(slots))
+    centers = np.concatenate([(lo[picked] + hi[picked]) / 2,
+                              rng.uniform((0, 0), (w, h), (n - on_slot, 2))])
+    half = size * rng.uniform(0.4, 0.6, (n, 2))
+    boxes = np.concatenate([centers - half, centers + half], axis=1)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w - 1)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h - 1)
+    return boxes.astype(np.float32)
+
+
+def measure(fn, repeats=REPEATS):
+    """fn 을 1회 워밍업 후 repeats 번 실행 -> 호출당 시간 (ms)"""
+    fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times = np.array(times)
+    return {
+        "mean_ms": round(float(times.mean()), 4),
+        "median_ms": round(float(np.median(times)), 4),
+        "min_ms": round(float(times.min()), 4),
+        "repeats": repeats,
+    }
+
+
+def bench_decode(video_path, steps=DECODE_STEPS, frames=DECODE_FRAMES):
+    """FrameSampler 로 앞쪽 frames 프레임 구간을 샘플링 간격별로 디코딩"""
+    results = []
+    for step in steps:
+        cap = cv2.VideoCapture(video_path)
+        sampler = FrameSampler(cap, step, end=frames)
+        t0 = time.perf_counter()
+        count = sum(1 for _ in sampler)
+        elapsed = time.perf_counter() - t0
+        cap.release()
+        results.append({
+            "step": step,
+            "frames_returned": count,
+            "frames_covered": sampler.index,
+            "sec": round(elapsed, 4),
+            "ms_per_returned_frame": round(elapsed * 1000 / count, 4) if count else None,
+            "covered_fps": round(sampler.index / elapsed, 1) if elapsed else None,
+            **sampler.stats,
+        })
+    return results
+
+
+def bench_inference(model, frames, batch_size=BATCH_SIZE):
+    """predict_boxes 를 batch_size 장씩 -> 프레임당 시간"""
+    def run():
+        for i in range(0, len(frames), batch_size):
+            predict_boxes(model, frames[i:i + batch_size], 640, 0.25)
+
+    repeats = REPEATS if isinstance(model, StubDetector) else 3
+    result = measure(run, repeats)
+    result["frames"] = len(frames)
+    result["batch_size"] = batch_size
+    result["ms_per_frame"] = round(result["median_ms"] / len(frames), 4)
+    return result
+
+
+def bench_encode(frames):
+    """JpegEncoder 로 프레임 한 장 인코딩 (원본 / 가로 640 축소)"""
+    results = []
+    for max_width in (0, 640):
+        encoder = JpegEncoder(max_width=max_width)
+        frame_iter = iter(frames * (REPEATS + 1))
+        result = measure(lambda: encoder.encode(next(frame_iter)))
+        result.update(encoder.summary())
+        results.append(result)
+    return results
+
+
+def bench_layout(n_slots, frame, box_counts=BOX_COUNTS):
+    """슬롯 n_slots 개 배치 하나: 규칙별 점유 계산 (박스 수별) + 오버레이 생성 / 그리기"""
+    slots = synthetic_slots(n_slots, frame.shape)
+    engines = {rule: SlotOccupancy(slots, rule=rule) for rule in OCCUPANCY_RULES}
+    label_engine = SlotOccupancy(slots, use_label_map=True)
+    t0 = time.perf_counter()
+    label_engine.label_map(frame.shape)
+    label_map_ms = (time.perf_counter() - t0) * 1000
+
+    matching = []
+    for n_boxes in box_counts:
+        boxes = synthetic_boxes(slots, n_boxes, frame.shape)
+        row = {"boxes": n_boxes}
+        for rule, engine in engines.items():
+            row[rule] = measure(lambda: engine.occupancy(boxes))
+        row["center_label_map"] = measure(lambda: label_engine.occupancy(boxes, frame.shape))
+        row["occupied"] = int(engines["center"].occupancy(boxes).sum())
+        matching.append(row)
+
+    t0 = time.perf_counter()
+    overlay = SlotOverlay(slots, frame.shape)
+    build_ms = (time.perf_counter() - t0) * 1000
+    # 매 프레임 일부 슬롯만 상태가 바뀌는 상황 (바뀐 슬롯만 다시 칠함)
+    rng = np.random.default_rng(SEED)
+    states = [rng.random(n_slots) < 0.5]
+    for _ in range(REPEATS + 1):
+        flip = rng.random(n_slots) < OVERLAY_FLIP_RATIO
+        states.append(states[-1] ^ flip)
+    state_iter = iter(states[1:])
+    canvas = frame.copy()
+    render = measure(lambda: overlay.render(canvas, next(state_iter)))
+
+    return {
+        "slots": n_slots,
+        "label_map_build_ms": round(label_map_ms, 3),
+        "index": engines["center"].index is not None,
+        "matching": matching,
+        "overlay": {"build_ms": round(build_ms, 3), "render": render,
+                    "flip_ratio": OVERLAY_FLIP_RATIO},
+    }
+
+
+def run_benchmark(video_path=VIDEO_PATH, detector=BENCH_DETECTOR,
+                  slot_counts=SLOT_COUNTS, box_counts=BOX_COUNTS):
+    """디코딩 / 추론 / 점유 계산 / 그리기 / 인코딩을 따로 측정 -> JSON 으로 저장할 수 있는 dict"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"영상을 열 수 없습니다: {video_path}")
+    video = {
+        "path": video_path,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+    frames = [frame for _, frame in FrameSampler(cap, end=INFER_FRAMES)]
+    cap.release()
+    frame = frames[0]
+
+    print("디코딩 측정...", file=sys.stderr)
+    decode = bench_decode(video_path)
+
+    print(f"추론 측정 ({detector})...", file=sys.stderr)
+    if detector == "stub":
+        model = StubDetector(synthetic_boxes(synthetic_slots(100, frame.shape), 100, frame.shape))
+    else:
+        model = load_detector(detector)
+    inference = bench_inference(model, frames)
+    inference["detector"] = detector
+
+    print("인코딩 측정...", file=sys.stderr)
+    encode = bench_encode(frames)
+
+    layouts = []
+    for n_slots in slot_counts:
+        print(f"슬롯 {n_slots}개 배치 측정...", file=sys.stderr)
+        layouts.append(bench_layout(n_slots, frame, box_counts))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "cv2_threads": cv2.getNumThreads(),
+            "repeats": REPEATS,
+            "seed": SEED,
+        },
+        "video": video,
+        "decode": decode,
+        "inference": inference,
+        "encode": encode,
+        "layouts": layouts,
+    }
+
+
+# 결과는 JSON (회귀 비교용): python benchmark.py [영상 경로] [출력 파일, 없으면 표준 출력]
+# 실제 모델로 추론을 재려면 BENCH_DETECTOR=ultralytics (또는 onnx / openvino)
+if __name__ == "__main__":
+    video = sys.argv[1] if len(sys.argv) > 1 else VIDEO_PATH
+    report = json.dumps(run_benchmark(video), ensure_ascii=False, indent=2)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"벤치마크 결과 저장: {sys.argv[2]}", file=sys.stderr)
+    else:
+        print(report)
@@ -1,14 +1,413 @@
 # test_db.py
-import mysql.connector
-
-def get_connection():
-    connection = mysql.connector.connect(
-        host='localhost',
-        user='root',             # MySQL 사용자 이름
-        password='12341234',     # MySQL 비밀번호
-        database='project_ai'    # 연결할 데이터베이스 이름
-    )
-    return connection  # <- 반드시 반환
+import queue
+import sqlite3
+import threading
+import time
+
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:  # SQLite 만 쓰는 환경 (테스트 등)
+    mysql = None
+
+DB_CONFIG = {
+    "host": 'localhost',
+    "user": 'root',             # MySQL 사용자 이름
+    "password": '12341234',     # MySQL 비밀번호
+    "database": 'project_ai',   # 연결할 데이터베이스 이름
+}
+POOL_SIZE = 5           # 조회용 커넥션 풀 크기 (기록 스레드는 풀 밖에서 따로 연결)
+POOL_WAIT_SEC = 5.0     # 풀이 비어 있으면 이 시간까지 기다림 (그래도 없으면 PoolError)
+POOL_RETRY_SEC = 0.05
+
+BATCH_ROWS = 500        # 이만큼 쌓이면 바로 기록
+FLUSH_SEC = 2.0         # 덜 쌓여도 이 간격마다 기록
+MAX_QUEUE_ROWS = 50000  # 기록 대기 최대 행 수 (넘치면 버리고 dropped 로 집계)
+
+# 이력 조회용 시간 구간 집계 (현지 시각 기준으로 자름, 서머타임은 시각마다 따로 반영)
+GRAINS = {"minute": 60, "hour": 3600, "day": 86400}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection(wait=POOL_WAIT_SEC):
+    """커넥션 풀에서 연결 하나 (close() 하면 풀로 돌아감)
+    풀이 다 쓰이고 있으면 바로 실패하지 않고 wait 초까지 반납을 기다림"""
+    global _pool
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python 이 설치되어 있지 않습니다.")
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name="parking", pool_size=POOL_SIZE, **DB_CONFIG)
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return _pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(POOL_RETRY_SEC)
+
+
+def get_direct_connection():
+    """풀을 거치지 않는 전용 연결 (계속 연결을 쥐고 있는 기록 스레드용)"""
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python 이 설치되어 있지 않습니다.")
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+def get_sqlite_connection(path):
+    """MySQL 대신 쓰는 SQLite 연결 (테스트 / 단독 실행용)"""
+    return sqlite3.connect(path, timeout=10)
+
+
+def parse_db_url(url):
+    """"mysql" 또는 "sqlite:///경로" -> (연결 함수, dialect), 빈 값이면 (None, None)"""
+    if not url:
+        return None, None
+    if url == "mysql":
+        return get_connection, "mysql"
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        return (lambda: get_sqlite_connection(path)), "sqlite"
+    raise ValueError(f"지원하지 않는 DB 주소: {url}")
+
+
+# 점유 변화 이벤트 + 주기적 집계
+SCHEMA = {
+    "mysql": [
+        """CREATE TABLE IF NOT EXISTS occupancy_events (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            lot VARCHAR(64) NOT NULL,
+            slot INT NOT NULL,
+            occupied TINYINT NOT NULL,
+            ts DOUBLE NOT NULL,
+            INDEX idx_events_lot_ts (lot, ts)
+        )""",
+        """CREATE TABLE IF NOT EXISTS occupancy_samples (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            lot VARCHAR(64) NOT NULL,
+            ts DOUBLE NOT NULL,
+            total INT NOT NULL,
+            occupied INT NOT NULL,
+            vehicles INT NOT NULL,
+            INDEX idx_samples_lot_ts (lot, ts)
+        )""",
+    ],
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS occupancy_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot TEXT NOT NULL,
+            slot INTEGER NOT NULL,
+            occupied INTEGER NOT NULL,
+            ts REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_events_lot_ts ON occupancy_events (lot, ts)",
+        """CREATE TABLE IF NOT EXISTS occupancy_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot TEXT NOT NULL,
+            ts REAL NOT NULL,
+            total INTEGER NOT NULL,
+            occupied INTEGER NOT NULL,
+            vehicles INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_samples_lot_ts ON occupancy_samples (lot, ts)",
+    ],
+}
+
+# 시간 구간 집계 (기본키 (lot, grain, bucket) 가 구간 조회 인덱스 역할)
+ROLLUP_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS occupancy_rollups (
+        lot VARCHAR(64) NOT NULL,
+        grain VARCHAR(8) NOT NULL,
+        bucket BIGINT NOT NULL,
+        samples INT NOT NULL,
+        occupied_sum BIGINT NOT NULL,
+        total_sum BIGINT NOT NULL,
+        vehicles_sum BIGINT NOT NULL,
+        occupied_max INT NOT NULL,
+        PRIMARY KEY (lot, grain, bucket)
+    )""",
+    """CREATE TABLE IF NOT EXISTS slot_rollups (
+        lot VARCHAR(64) NOT NULL,
+        grain VARCHAR(8) NOT NULL,
+        bucket BIGINT NOT NULL,
+        slot INT NOT NULL,
+        arrivals INT NOT NULL,
+        departures INT NOT NULL,
+        PRIMARY KEY (lot, grain, bucket, slot)
+    )""",
+]
+SCHEMA["mysql"] += ROLLUP_SCHEMA
+SCHEMA["sqlite"] += ROLLUP_SCHEMA
+
+INSERTS = {
+    "events": "INSERT INTO occupancy_events (lot, slot, occupied, ts) VALUES ({p}, {p}, {p}, {p})",
+    "samples": "INSERT INTO occupancy_samples (lot, ts, total, occupied, vehicles) VALUES ({p}, {p}, {p}, {p}, {p})",
+}
+
+
+def placeholder(dialect):
+    return "%s" if dialect == "mysql" else "?"
+
+
+def upsert_sql(dialect, table, keys, sums, maxes=()):
+    """같은 키가 있으면 sums 는 더하고 maxes 는 큰 값으로 (MySQL / SQLite 문법 차이만 처리)"""
+    columns = list(keys) + list(sums) + list(maxes)
+    p = placeholder(dialect)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([p] * len(columns))})"
+    if dialect == "mysql":
+        updates = [f"{c} = {c} + VALUES({c})" for c in sums] + \
+                  [f"{c} = GREATEST({c}, VALUES({c}))" for c in maxes]
+        return sql + " ON DUPLICATE KEY UPDATE " + ", ".join(updates)
+    updates = [f"{c} = {c} + excluded.{c}" for c in sums] + \
+              [f"{c} = MAX({c}, excluded.{c})" for c in maxes]
+    return sql + f" ON CONFLICT({', '.join(keys)}) DO UPDATE SET " + ", ".join(updates)
+
+
+def bucket_start(ts, grain):
+    """ts 가 속한 구간의 시작 시각 (현지 시각 기준)
+    UTC 오프셋은 ts 시점 값을 쓰고, 일 단위는 서머타임 전환일에도 현지 자정부터 시작"""
+    local = time.localtime(ts)
+    if grain == "day":
+        return int(time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1)))
+    size = GRAINS[grain]
+    offset = local.tm_gmtoff
+    return int((ts + offset) // size * size - offset)
+
+
+def rollup_rows(events, samples):
+    """이번에 기록할 이벤트 / 집계 행을 구간별로 미리 합침 -> (주차장 집계 행, 슬롯 집계 행)"""
+    lots = {}
+    for lot, ts, total, occupied, vehicles in samples:
+        for grain in GRAINS:
+            key = (lot, grain, bucket_start(ts, grain))
+            row = lots.setdefault(key, [0, 0, 0, 0, 0])
+            row[0] += 1
+            row[1] += occupied
+            row[2] += total
+            row[3] += vehicles
+            row[4] = max(row[4], occupied)
+    slots = {}
+    for lot, slot, occupied, ts in events:
+        for grain in GRAINS:
+            key = (lot, grain, bucket_start(ts, grain), slot)
+            row = slots.setdefault(key, [0, 0])
+            row[0 if occupied else 1] += 1
+    return ([key + tuple(v) for key, v in lots.items()],
+            [key + tuple(v) for key, v in slots.items()])
+
+
+def init_schema(conn, dialect):
+    cur = conn.cursor()
+    for sql in SCHEMA[dialect]:
+        cur.execute(sql)
+    conn.commit()
+    cur.close()
+
+
+class OccupancyWriter:
+    """점유 변화 이벤트 / 집계를 백그라운드 스레드에서 모아서 기록
+    분석 루프는 큐에 넣기만 하고(가득 차면 버림) DB 를 기다리지 않는다.
+    BATCH_ROWS 행이 모이거나 FLUSH_SEC 가 지나면 테이블별 executemany 한 번 + commit 한 번."""
+
+    def __init__(self, connect, dialect, batch_rows=BATCH_ROWS, flush_sec=FLUSH_SEC,
+                 max_queue=MAX_QUEUE_ROWS):
+        self.connect = connect
+        self.dialect = dialect
+        self.batch_rows = batch_rows
+        self.flush_sec = flush_sec
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.conn = None
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+        self.last_error = None
+        p = placeholder(dialect)
+        self.inserts = {table: sql.format(p=p) for table, sql in INSERTS.items()}
+        self.rollup_upserts = (
+            upsert_sql(dialect, "occupancy_rollups", ("lot", "grain", "bucket"),
+                       ("samples", "occupied_sum", "total_sum", "vehicles_sum"), ("occupied_max",)),
+            upsert_sql(dialect, "slot_rollups", ("lot", "grain", "bucket", "slot"),
+                       ("arrivals", "departures")),
+        )
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _put(self, table, row):
+        try:
+            self.queue.put_nowait((table, row))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def add_events(self, lot, ts, slot_ids, occupied):
+        """상태가 바뀐 슬롯들 (slot_ids 는 1부터 시작하는 슬롯 번호)"""
+        for slot_id, o in zip(slot_ids, occupied):
+            self._put("events", (lot, int(slot_id), int(o), float(ts)))
+
+    def add_sample(self, lot, ts, total, occupied, vehicles):
+        self._put("samples", (lot, float(ts), int(total), int(occupied), int(vehicles)))
+
+    def _ensure_connection(self):
+        if self.conn is None:
+            self.conn = self.connect()
+            init_schema(self.conn, self.dialect)
+        return self.conn
+
+    def _write(self, conn, buffers):
+        """테이블별 executemany (MySQL 커넥터는 여러 행 INSERT 한 문장으로 보냄)
+        원본 행과 같은 트랜잭션에서 분/시/일 집계도 누적"""
+        cur = conn.cursor()
+        for table, rows in buffers.items():
+            if rows:
+                cur.executemany(self.inserts[table], rows)
+        lot_rows, slot_rows = rollup_rows(buffers["events"], buffers["samples"])
+        for sql, rows in zip(self.rollup_upserts, (lot_rows, slot_rows)):
+            if rows:
+                cur.executemany(sql, rows)
+        cur.close()
+
+    def _flush(self, buffers):
+        n_rows = sum(len(rows) for rows in buffers.values())
+        if n_rows == 0:
+            return
+        try:
+            conn = self._ensure_connection()
+            self._write(conn, buffers)
+            conn.commit()
+            self.stats["written"] += n_rows
+            self.stats["flushes"] += 1
+        except Exception as e:
+            # DB 장애 시 이번 묶음은 버리고 다음 기록 때 다시 연결
+            if str(e) != self.last_error:
+                print(f"점유 기록 실패: {e}")
+            self.last_error = str(e)
+            self.stats["failed"] += n_rows
+            self._close()
+        for rows in buffers.values():
+            rows.clear()
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def _run(self):
+        buffers = {table: [] for table in self.inserts}
+        pending = 0
+        deadline = time.monotonic() + self.flush_sec
+        while True:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                item = None
+            if item is not None:
+                table, row = item
+                buffers[table].append(row)
+                pending += 1
+            if pending >= self.batch_rows or time.monotonic() >= deadline or (self.stopped and item is None):
+                self._flush(buffers)
+                pending = 0
+                deadline = time.monotonic() + self.flush_sec
+                if self.stopped and self.queue.empty():
+                    break
+        self._close()
+
+    def stop(self):
+        """남은 행을 모두 기록하고 종료"""
+        self.stopped = True
+        self.thread.join(timeout=10.0)
+
+    def snapshot(self):
+        return {"dialect": self.dialect, "queued": self.queue.qsize(), **self.stats}
+
+
+class OccupancyHistory:
+    """집계 테이블에서 기간 조회 (원본 이벤트는 읽지 않음)"""
+
+    def __init__(self, connect, dialect):
+        self.connect = connect
+        self.dialect = dialect
+        self.schema_ready = False
+
+    def _query(self, sql, params):
+        conn = self.connect()
+        try:
+            if not self.schema_ready:
+                init_schema(conn, self.dialect)
+                self.schema_ready = True
+            cur = conn.cursor()
+            cur.execute(sql.replace("?", placeholder(self.dialect)), params)
+            rows = cur.fetchall()
+            cur.close()
+            return rows
+        finally:
+            conn.close()
+
+    def occupancy(self, lot, grain, start, end):
+        """구간별 평균 점유율 / 최대 점유 / 평균 차량 수"""
+        rows = self._query(
+            "SELECT bucket, samples, occupied_sum, total_sum, vehicles_sum, occupied_max "
+            "FROM occupancy_rollups WHERE lot = ? AND grain = ? AND bucket >= ? AND bucket < ? "
+            "ORDER BY bucket",
+            (lot, grain, bucket_start(start, grain), end))
+        return [
+            {
+                "bucket": int(bucket),
+                "avg_occupancy": round(occupied_sum / total_sum, 4) if total_sum else 0.0,
+                "avg_vehicles": round(vehicles_sum / samples, 2) if samples else 0.0,
+                "max_occupied": int(occupied_max),
+                "samples": int(samples),
+            }
+            for bucket, samples, occupied_sum, total_sum, vehicles_sum, occupied_max in rows
+        ]
+
+    def hourly_profile(self, lot, start, end):
+        """시간대(0~23시)별 평균 점유율 (hour 집계를 시각별로 다시 합침)"""
+        rows = self._query(
+            "SELECT bucket, samples, occupied_sum, total_sum FROM occupancy_rollups "
+            "WHERE lot = ? AND grain = 'hour' AND bucket >= ? AND bucket < ?",
+            (lot, bucket_start(start, "hour"), end))
+        sums = [[0, 0, 0] for _ in range(24)]
+        for bucket, samples, occupied_sum, total_sum in rows:
+            hour = time.localtime(bucket).tm_hour
+            sums[hour][0] += samples
+            sums[hour][1] += occupied_sum
+            sums[hour][2] += total_sum
+        return [
+            {"hour": hour, "avg_occupancy": round(o / t, 4) if t else None, "samples": n}
+            for hour, (n, o, t) in enumerate(sums)
+        ]
+
+    def turnover(self, lot, grain, start, end):
+        """슬롯별 입차(빈칸 -> 점유) / 출차 횟수 합계"""
+        rows = self._query(
+            "SELECT slot, SUM(arrivals), SUM(departures) FROM slot_rollups "
+            "WHERE lot = ? AND grain = ? AND bucket >= ? AND bucket < ? GROUP BY slot ORDER BY slot",
+            (lot, grain, bucket_start(start, grain), end))
+        return [{"slot": int(slot), "arrivals": int(a), "departures": int(d)} for slot, a, d in rows]
+
+
+def open_history(url):
+    connect, dialect = parse_db_url(url)
+    if connect is None:
+        return None
+    return OccupancyHistory(connect, dialect)
+
+
+def open_writer(url):
+    """DB 주소로 OccupancyWriter 생성, 빈 값이면 None (기록 안 함)"""
+    connect, dialect = parse_db_url(url)
+    if connect is None:
+        return None
+    if dialect == "mysql":
+        # 기록 스레드가 풀 연결 하나를 계속 차지하지 않도록 별도 연결 사용
+        connect = get_direct_connection
+    return OccupancyWriter(connect, dialect)
+
 
 if __name__ == "__main__":
     conn = get_connection()
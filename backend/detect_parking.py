@@ -2,6 +2,7 @@ import cv2
 import csv
 import numpy as np
 from ultralytics import YOLO
+from occupancy import SlotOccupancy, boxes_from_results
 
 # -------------------------------
 # 설정
@@ -11,6 +12,8 @@ MODEL_PATH = "best.pt"  # 학습된 YOLO 모델
 CONFIDENCE = 0.25
 IOU = 0.3
 IMGSZ = 1280
+OCCUPANCY_RULE = "iou"   # "center" | "iou" | "overlap"
+SLOT_IOU = 0.2           # IoU 0.2 이상이면 점유로 간주
 
 # -------------------------------
 # 슬롯 로드
@@ -25,34 +28,11 @@ def load_slots(csv_path="slots.csv"):
             slots.append(pts)
     return slots
 
-# -------------------------------
-# IoU 기준으로 슬롯 안 차량 체크
-def is_car_in_slot(car_box, slot_points):
-    x1, y1, x2, y2 = car_box
-    sx = [p[0] for p in slot_points]
-    sy = [p[1] for p in slot_points]
-
-    # 슬롯 영역 bounding box
-    bx1, by1, bx2, by2 = min(sx), min(sy), max(sx), max(sy)
-
-    # 교차 영역 계산
-    inter_x1 = max(x1, bx1)
-    inter_y1 = max(y1, by1)
-    inter_x2 = min(x2, bx2)
-    inter_y2 = min(y2, by2)
-
-    inter_area = max(0, inter_x2 - inter_x1) * max(0, inter_y2 - inter_y1)
-    car_area = (x2 - x1) * (y2 - y1)
-    slot_area = (bx2 - bx1) * (by2 - by1)
-
-    # IoU 계산
-    iou = inter_area / float(car_area + slot_area - inter_area + 1e-6)
-    return iou > 0.2  # IoU 0.2 이상이면 점유로 간주
-
 # -------------------------------
 def main():
     slots = load_slots()
     total_slots = len(slots)
+    slot_engine = SlotOccupancy(slots, rule=OCCUPANCY_RULE, threshold=SLOT_IOU)
     model = YOLO(MODEL_PATH)
 
     cap = cv2.VideoCapture(VIDEO_PATH)
@@ -72,20 +52,15 @@ def main():
 
         # YOLO 차량 탐지
         results = model.predict(frame, imgsz=IMGSZ, conf=CONFIDENCE, iou=IOU, verbose=False)
-        car_boxes = []
-        for r in results:
-            for box in r.boxes.xyxy.tolist():
-                x1, y1, x2, y2 = map(int, box)
-                car_boxes.append((x1, y1, x2, y2))
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)  # 차량은 노란색
+        car_boxes = boxes_from_results(results)
+        for x1, y1, x2, y2 in car_boxes.tolist():
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)  # 차량은 노란색
 
-        # 슬롯별 점유 여부
-        occupied_count = 0
+        # 슬롯별 점유 여부 (공간 인덱스로 차량 근처 슬롯만 검사)
+        occupied = slot_engine.occupancy(car_boxes)
+        occupied_count = int(occupied.sum())
         for idx, slot in enumerate(slots):
-            occupied = any(is_car_in_slot(car, slot) for car in car_boxes)
-            if occupied:
-                occupied_count += 1
-            color = (0, 0, 255) if occupied else (0, 255, 0)  # 빨강=점유, 초록=빈자리
+            color = (0, 0, 255) if occupied[idx] else (0, 255, 0)  # 빨강=점유, 초록=빈자리
 
             pts = np.array(slot, np.int32).reshape((-1, 1, 2))
             cv2.polylines(frame, [pts], True, color, 2)
@@ -1,7 +1,10 @@
 import cv2
 import csv
+import time
 import numpy as np
 from ultralytics import YOLO
+from occupancy import SlotOccupancy
+from inference import BATCH_SIZE, ThroughputMeter, predict_boxes, read_batches
 
 #자신의 경로에 맞게
 VIDEO_PATH = "videos/test.mp4"
@@ -28,28 +31,12 @@ def load_slots(csv_path):
         print(f"오류: {csv_path} 파일을 찾을 수 없습니다.")
         return []
 
-# 차량 중심점이 슬롯에 있는지 확인 (iou -> 변경)
-def is_car_center_in_slot(car_box, slot_points):
-    x1, y1, x2, y2 = car_box
-    
-    # 차량의 중심점(Center Point) 계산
-    car_center_x = int((x1 + x2) / 2)
-    car_center_y = int((y1 + y2) / 2)
-    car_center = (car_center_x, car_center_y)
-
-    slot_cnt = np.array(slot_points, dtype=np.int32)
-
-    # pointPolygonTest: 점이 다각형 안에 있으면 양수(+), 밖에 있으면 음수(-) 반환
-    # measureDist=False로 하면 안에 있으면 +1, 경계면 0, 밖이면 -1 반환
-    result = cv2.pointPolygonTest(slot_cnt, car_center, False)
-    
-    return result >= 0  # 0보다 크거나 같으면 안에 있는 것
-
 def main():
     slots = load_slots(CSV_PATH)
     if not slots: return
 
     total_slots = len(slots)
+    slot_engine = SlotOccupancy(slots)
 
     model = YOLO(MODEL_PATH) 
 
@@ -67,65 +54,64 @@ def main():
 
     print("--- 주차 감지 시작 (종료하려면 'q'를 누르세요) ---")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    quit_requested = False
+    meter = ThroughputMeter(BATCH_SIZE)
 
-        results = model.predict(frame, imgsz=IMGSZ, conf=CONFIDENCE, classes=[0], verbose=False)    #클래스 0 : car
-        
-        car_boxes = []
-        for r in results:
-            for box in r.boxes.xyxy.tolist():
-                x1, y1, x2, y2 = map(int, box)
-                car_boxes.append((x1, y1, x2, y2))
+    # BATCH_SIZE 장씩 모아서 한 번에 추론 (클래스 0 : car)
+    for _, frames in read_batches(cap, BATCH_SIZE):
+        t0 = time.perf_counter()
+        boxes_per_frame = predict_boxes(model, frames, IMGSZ, CONFIDENCE)
+        meter.add(len(frames), time.perf_counter() - t0)
+
+        for frame, car_boxes in zip(frames, boxes_per_frame):
+            for x1, y1, x2, y2 in car_boxes.tolist():
                 # 차량 박스 (노란색, 얇게)
                 cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 1)
 
-        # 2. 슬롯별 점유 여부 확인
-        occupied_count = 0
+            # 2. 슬롯별 점유 여부 확인
+            # 슬롯 안에 중심점이 들어간 차량이 하나라도 있으면 점유 (전체 슬롯 한 번에 계산)
+            occupied = slot_engine.occupancy(car_boxes)
+            occupied_count = int(occupied.sum())
         
-        for idx, slot in enumerate(slots):
-            # 이 슬롯 안에 중심점이 들어간 차량이 하나라도 있으면 점유
-            is_occupied = False
-            for car in car_boxes:
-                if is_car_center_in_slot(car, slot):
-                    is_occupied = True
-                    break
+            for idx, slot in enumerate(slots):
+                if occupied[idx]:
+                    color = (0, 0, 255) # 빨강 (점유)
+                    thickness = 2
+                else:
+                    color = (0, 255, 0) # 초록 (비어있음)
+                    thickness = 1 # 빈 자리는 얇게
+
+                # 슬롯 그리기
+                pts = np.array(slot, np.int32).reshape((-1, 1, 2))
+                cv2.polylines(frame, [pts], True, color, thickness)
             
-            if is_occupied:
-                occupied_count += 1
-                color = (0, 0, 255) # 빨강 (점유)
-                thickness = 2
-            else:
-                color = (0, 255, 0) # 초록 (비어있음)
-                thickness = 1 # 빈 자리는 얇게
-
-            # 슬롯 그리기
-            pts = np.array(slot, np.int32).reshape((-1, 1, 2))
-            cv2.polylines(frame, [pts], True, color, thickness)
-            
-            # 슬롯 번호 작게 표시
-            text_pos = slot[0] # 첫 번째 점 위치에 텍스트
-            cv2.putText(frame, str(idx+1), text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+                # 슬롯 번호 작게 표시
+                text_pos = slot[0] # 첫 번째 점 위치에 텍스트
+                cv2.putText(frame, str(idx+1), text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
 
-        # 3. 전체 현황 표시
-        empty_count = total_slots - occupied_count
-        info_text = f"Total: {total_slots} | Occupied: {occupied_count} | Empty: {empty_count}"
+            # 3. 전체 현황 표시
+            empty_count = total_slots - occupied_count
+            info_text = f"Total: {total_slots} | Occupied: {occupied_count} | Empty: {empty_count}"
         
-        # 상단 배경 박스
-        cv2.rectangle(frame, (0, 0), (550, 40), (0, 0, 0), -1)
-        cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            # 상단 배경 박스
+            cv2.rectangle(frame, (0, 0), (550, 40), (0, 0, 0), -1)
+            cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+            out_video.write(frame)
+            cv2.imshow("Parking Detection", frame)
 
-        out_video.write(frame)
-        cv2.imshow("Parking Detection", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                quit_requested = True
+                break
 
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        if quit_requested:
             break
 
     cap.release()
     out_video.release()
     cv2.destroyAllWindows()
+    stats = meter.summary()
+    print(f"추론 처리량: {stats['fps']} fps (batch={BATCH_SIZE}, 배치당 {stats['batch_ms']} ms)")
     print("분석 완료")
 
 if __name__ == "__main__":
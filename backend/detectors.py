@@ -0,0 +1,275 @@
+import os
+import ast
+import time
+import threading
+import cv2
+import numpy as np
+from inference import BATCH_SIZE, nms
+
+# 배포별 감지 모델 선택: "ultralytics" (best.pt, 기본) | "onnx" (ONNX Runtime) | "openvino"
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "ultralytics")
+DETECTOR_MODEL = os.environ.get("DETECTOR_MODEL", "")       # 비우면 백엔드별 기본 경로
+DETECTOR_THREADS = int(os.environ.get("DETECTOR_THREADS", 0))  # 0 이면 런타임 기본값
+DEFAULT_PATHS = {
+    "ultralytics": "best.pt",
+    "onnx": "best.onnx",
+    "openvino": "best_openvino_model/best.xml",
+}
+EXPORT_IMGSZ = 640   # 내보낸 모델의 고정 입력 크기
+NMS_IOU = 0.7        # ultralytics predict 기본값과 같게
+WARMUP_RUNS = 2
+
+
+class _Tensor:
+    """ultralytics 결과처럼 .cpu().numpy() 로 꺼낼 수 있게 감싼 배열"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = _Tensor(xyxy)
+        self.conf = _Tensor(conf)
+        self.cls = _Tensor(np.zeros(len(conf), dtype=np.float32))
+
+    def __len__(self):
+        return len(self.conf.array)
+
+
+class _Result:
+    def __init__(self, xyxy, conf):
+        self.boxes = _Boxes(xyxy, conf)
+
+
+def letterbox(frame, size):
+    """비율을 유지해서 size x size 에 맞추고 남는 곳은 회색으로 채움 -> (이미지, 배율, (좌, 상) 여백)"""
+    h, w = frame.shape[:2]
+    ratio = min(size / h, size / w)
+    nh, nw = round(h * ratio), round(w * ratio)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas, ratio, (left, top)
+
+
+class ExportedDetector:
+    """내보낸 YOLO 모델(ONNX / OpenVINO)을 ultralytics YOLO 대신 쓰는 감지기
+    입력 크기는 내보낼 때 정한 값으로 고정이고 predict() 결과 형식은 ultralytics 와 같아서
+    predict_boxes / predict_tiled / 스케줄러 등 기존 코드를 그대로 쓴다.
+    배치 크기가 고정된 모델은 모자란 배치를 빈 이미지로 채워서 돌린다.
+    하위 클래스는 _run(NCHW float32 배치) -> (N, 4 + 클래스 수, 후보 수) 출력만 구현"""
+
+    backend = None
+
+    def __init__(self, path, imgsz=EXPORT_IMGSZ, threads=DETECTOR_THREADS):
+        self.path = path
+        self.imgsz = imgsz
+        self.threads = threads
+        self.max_batch = None  # None 이면 배치 크기 제한 없음 (dynamic 으로 내보낸 모델)
+        self.fixed_batch = False  # True 면 항상 max_batch 장씩 넣어야 함
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def _decode(self, output, conf, iou, meta):
+        # YOLOv8 출력: (4 + 클래스 수, 후보 수), 상자는 입력 이미지 기준 (cx, cy, w, h)
+        pred = output.T
+        scores = pred[:, 4:].max(axis=1)
+        keep = scores >= conf
+        pred, scores = pred[keep], scores[keep]
+        if len(pred) == 0:
+            return _Result(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+        ratio, (left, top), (h, w) = meta
+        cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.stack([cx - bw / 2 - left, cy - bh / 2 - top,
+                          cx + bw / 2 - left, cy + bh / 2 - top], axis=1) / ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        order = nms(boxes, scores, iou)
+        return _Result(boxes[order].astype(np.float32), scores[order].astype(np.float32))
+
+    def predict(self, source, imgsz=None, conf=0.25, iou=NMS_IOU, classes=None, verbose=False, **kwargs):
+        """ultralytics YOLO.predict 와 같은 호출 방식 (imgsz 는 무시, 클래스는 car 하나)"""
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        if not frames:
+            return []
+        inputs, metas = [], []
+        for frame in frames:
+            image, ratio, pad = letterbox(frame, self.imgsz)
+            inputs.append(image)
+            metas.append((ratio, pad, frame.shape[:2]))
+        # BGR -> RGB, HWC -> CHW, 0~1
+        batch = np.ascontiguousarray(np.stack(inputs)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        step = self.max_batch or len(frames)
+        outputs = []
+        for i in range(0, len(frames), step):
+            chunk = batch[i:i + step]
+            n = len(chunk)
+            if self.fixed_batch and n < step:
+                chunk = np.concatenate([chunk, np.zeros((step - n,) + chunk.shape[1:], dtype=chunk.dtype)])
+            outputs.append(self._run(chunk)[:n])
+        outputs = np.concatenate(outputs)
+        return [self._decode(output, conf, iou, meta) for output, meta in zip(outputs, metas)]
+
+
+class OnnxDetector(ExportedDetector):
+    backend = "onnx"
+
+    def __init__(self, path, imgsz=EXPORT_IMGSZ, threads=DETECTOR_THREADS):
+        import onnxruntime as ort
+        super().__init__(path, imgsz, threads)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+        else:
+            # 입력 크기가 dynamic 이면 ultralytics 가 남긴 메타데이터의 내보낼 때 크기를 사용
+            meta = self.session.get_modelmeta().custom_metadata_map
+            if "imgsz" in meta:
+                self.imgsz = int(ast.literal_eval(meta["imgsz"])[0])
+        if isinstance(model_input.shape[0], int):
+            self.max_batch = model_input.shape[0]
+            self.fixed_batch = True
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    backend = "openvino"
+
+    def __init__(self, path, imgsz=EXPORT_IMGSZ, threads=DETECTOR_THREADS):
+        import openvino as ov
+        super().__init__(path, imgsz, threads)
+        config = {"PERFORMANCE_HINT": "THROUGHPUT"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        core = ov.Core()
+        model = core.read_model(path)
+        shape = model.inputs[0].get_partial_shape()
+        if shape[2].is_static:
+            self.imgsz = shape[2].get_length()
+        if shape[0].is_static:
+            self.max_batch = shape[0].get_length()
+            self.fixed_batch = True
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+    def _run(self, batch):
+        return self.compiled([batch])[self.output]
+
+
+def load_detector(backend=DETECTOR_BACKEND, path=None, threads=DETECTOR_THREADS):
+    """백엔드 이름으로 감지기 생성 (ultralytics 는 이 때 처음 import -> ONNX 배포는 PyTorch 를 안 읽음)"""
+    path = path or DETECTOR_MODEL or DEFAULT_PATHS.get(backend)
+    if backend == "ultralytics":
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return YOLO(path)
+    if backend == "onnx":
+        return OnnxDetector(path, threads=threads)
+    if backend == "openvino":
+        return OpenVinoDetector(path, threads=threads)
+    raise ValueError(f"지원하지 않는 감지 백엔드: {backend}")
+
+
+def warmup(model, imgsz=EXPORT_IMGSZ, runs=WARMUP_RUNS):
+    """빈 프레임으로 미리 추론해서 첫 요청이 초기화 비용을 떠안지 않게 함 -> 걸린 시간(초)"""
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        model.predict([frame], imgsz=imgsz, conf=0.25, classes=[0], verbose=False)
+    return time.perf_counter() - t0
+
+
+class LazyDetector:
+    """감지 모델을 처음 get() 할 때 로드 + 워밍업 (여러 스레드가 동시에 불러도 한 번만)
+    서버는 모델 없이 바로 뜨고, preload() 로 백그라운드에서 미리 준비할 수 있다.
+    로드에 실패하면 다음 get() 에서 다시 시도한다."""
+
+    def __init__(self, backend=DETECTOR_BACKEND, path=None, threads=DETECTOR_THREADS):
+        self.backend = backend
+        self.path = path
+        self.threads = threads
+        self.lock = threading.Lock()
+        self.model = None
+        self.state = "cold"  # cold -> loading -> ready (실패하면 failed)
+        self.error = None
+        self.load_sec = None
+        self.warmup_sec = None
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    def get(self):
+        model = self.model
+        if model is not None:
+            return model
+        with self.lock:
+            if self.model is None:
+                self.state = "loading"
+                t0 = time.perf_counter()
+                try:
+                    model = load_detector(self.backend, self.path, self.threads)
+                    self.load_sec = time.perf_counter() - t0
+                    # 첫 요청이 모델 초기화 비용을 떠안지 않도록 한 번 추론
+                    self.warmup_sec = warmup(model)
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.model = model
+                self.state = "ready"
+                self.error = None
+                print(f"감지 모델 준비 완료: {self.backend} "
+                      f"(로드 {self.load_sec:.2f}초, 워밍업 {self.warmup_sec:.2f}초)")
+            return self.model
+
+    def preload(self):
+        """백그라운드 스레드에서 모델 로드 + 워밍업"""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"감지 모델 로드 실패: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            "backend": self.backend,
+            "state": self.state,
+            "error": self.error,
+            "load_sec": round(self.load_sec, 3) if self.load_sec is not None else None,
+            "warmup_sec": round(self.warmup_sec, 3) if self.warmup_sec is not None else None,
+        }
+
+
+# best.pt 를 고정 입력 크기 / 고정 배치(BATCH_SIZE) 모델로 내보내기
+# python detectors.py [onnx|openvino] [입력 크기] (오프라인 분석과 같게 하려면 ai_module.IMGSZ)
+if __name__ == "__main__":
+    import sys
+    from ultralytics import YOLO
+    fmt = sys.argv[1] if len(sys.argv) > 1 else "onnx"
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else EXPORT_IMGSZ
+    print(YOLO(DEFAULT_PATHS["ultralytics"]).export(format=fmt, imgsz=size, dynamic=False, batch=BATCH_SIZE))
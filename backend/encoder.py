@@ -0,0 +1,91 @@
+import time
+import cv2
+
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+except ImportError:  # PyTurboJPEG / libjpeg-turbo 가 없으면 cv2 로 인코딩
+    TurboJPEG = None
+
+JPEG_QUALITY = 80     # 스트림 화질 (cv2 기본값은 95)
+STREAM_MAX_WIDTH = 0  # 스트림 최대 가로 크기 (0 이면 원본 해상도)
+# 축소 보간법: INTER_AREA 보다 훨씬 빠르고 스트림 화질에는 차이가 거의 없음
+RESIZE_INTERPOLATION = cv2.INTER_LINEAR
+
+_turbo = None
+
+
+def _turbo_encoder():
+    """TurboJPEG 인스턴스 (라이브러리 로드는 한 번만), 사용할 수 없으면 None"""
+    global _turbo
+    if _turbo is None and TurboJPEG is not None:
+        try:
+            _turbo = TurboJPEG()
+        except (OSError, RuntimeError) as e:
+            print(f"libjpeg-turbo 로드 실패, cv2 로 인코딩합니다: {e}")
+            _turbo = False
+    return _turbo or None
+
+
+class JpegEncoder:
+    """MJPEG 스트림용 JPEG 인코더
+    max_width 보다 큰 프레임은 미리 잡아 둔 버퍼로 축소한 뒤 인코딩하고,
+    libjpeg-turbo 바인딩이 있으면 그쪽을 사용한다 (backend="auto" | "turbo" | "cv2").
+    프레임당 인코딩 시간 / 크기를 집계한다."""
+
+    def __init__(self, quality=JPEG_QUALITY, max_width=STREAM_MAX_WIDTH, backend="auto"):
+        self.quality = quality
+        self.max_width = max_width
+        self.turbo = _turbo_encoder() if backend in ("auto", "turbo") else None
+        if backend == "turbo" and self.turbo is None:
+            print("libjpeg-turbo 를 사용할 수 없어 cv2 로 인코딩합니다.")
+        self.backend = "turbo" if self.turbo is not None else "cv2"
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.resized = None  # 축소 결과를 담는 재사용 버퍼
+
+        self.frames = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.last_ms = 0.0
+
+    def _resize(self, frame):
+        h, w = frame.shape[:2]
+        if not self.max_width or w <= self.max_width:
+            return frame
+        size = (self.max_width, round(h * self.max_width / w))
+        if self.resized is None or self.resized.shape[:2] != (size[1], size[0]):
+            self.resized = cv2.resize(frame, size, interpolation=RESIZE_INTERPOLATION)
+        else:
+            cv2.resize(frame, size, dst=self.resized, interpolation=RESIZE_INTERPOLATION)
+        return self.resized
+
+    def encode(self, frame):
+        """프레임 -> JPEG bytes"""
+        t0 = time.perf_counter()
+        frame = self._resize(frame)
+        if self.turbo is not None:
+            data = self.turbo.encode(frame, quality=self.quality, jpeg_subsample=TJSAMP_420)
+        else:
+            _, jpeg = cv2.imencode(".jpg", frame, self.params)
+            data = jpeg.tobytes()
+        elapsed = time.perf_counter() - t0
+
+        self.frames += 1
+        self.seconds += elapsed
+        self.bytes += len(data)
+        self.last_ms = elapsed * 1000
+        return data
+
+    def multipart(self, frame):
+        """MJPEG(multipart/x-mixed-replace) 한 조각"""
+        return b"".join((b"--frame\r\nContent-Type: image/jpeg\r\n\r\n", self.encode(frame), b"\r\n"))
+
+    def summary(self):
+        return {
+            "backend": self.backend,
+            "quality": self.quality,
+            "max_width": self.max_width,
+            "frames": self.frames,
+            "avg_encode_ms": round(self.seconds * 1000 / self.frames, 2) if self.frames else 0.0,
+            "last_encode_ms": round(self.last_ms, 2),
+            "avg_kb": round(self.bytes / 1024 / self.frames, 1) if self.frames else 0.0,
+        }
@@ -0,0 +1,292 @@
+import time
+import numpy as np
+from occupancy import box_centers, boxes_from_results
+from sources import FrameSampler
+
+BATCH_SIZE = 8
+
+ROI_TILE = 320          # 바뀐 슬롯을 이 크기 격자 단위로 묶어서 잘라냄 (px)
+ROI_PAD = 48            # 잘라낼 영역 여백 (슬롯 경계에 걸친 차량까지 포함)
+ROI_IMGSZ = 416         # 잘라낸 영역 추론 크기
+FULL_REFRESH_EVERY = 10 # ROI 재감지 N번마다 전체 프레임 감지
+ROI_MAX_CHANGED = 0.5   # 바뀐 슬롯 비율이 이보다 크면 그냥 전체 프레임 감지
+
+TILE_SIZE = 640         # 고해상도 영상 분할 타일 크기 (원본 픽셀 그대로 추론)
+TILE_OVERLAP = 128      # 타일 간 겹침 (경계에 걸친 차량이 한 타일에는 온전히 들어가도록)
+TILE_NMS_IOU = 0.5      # 타일 간 중복 박스 제거 IoU
+TILE_NMS_IOS = 0.7      # 작은 박스가 큰 박스에 이 비율 이상 포함되면 잘린 중복으로 보고 제거
+
+
+# 영상에서 batch_size 장씩 읽어서 (프레임 번호 목록, 프레임 목록) 으로 돌려줌
+# step: step 프레임마다 한 장만 디코딩 (건너뛰는 프레임은 FrameSampler 가 grab / seek)
+# cap 대신 FrameSampler 를 넘기면 그 설정(구간 등)대로 읽음
+def read_batches(cap, batch_size=BATCH_SIZE, step=1):
+    indices, frames = [], []
+    sampler = cap if isinstance(cap, FrameSampler) else FrameSampler(cap, step)
+    for frame_index, frame in sampler:
+        indices.append(frame_index)
+        frames.append(frame)
+        if len(frames) == batch_size:
+            yield indices, frames
+            indices, frames = [], []
+    if frames:
+        yield indices, frames
+
+
+def read_gated_batches(cap, gate, batch_size=BATCH_SIZE, max_pending=256, step=1):
+    """MotionGate 로 감지가 필요한 프레임만 batch_size 장 모아서 돌려줌
+    yield: [(프레임 번호, 프레임 또는 None), ...]  (None = 감지 생략, 이전 결과 재사용)"""
+    pending = []
+    n_detect = 0
+    sampler = cap if isinstance(cap, FrameSampler) else FrameSampler(cap, step)
+    for frame_index, frame in sampler:
+        if gate.should_detect(frame):
+            pending.append((frame_index, frame))
+            n_detect += 1
+        else:
+            pending.append((frame_index, None))
+        if n_detect == batch_size or len(pending) >= max_pending:
+            yield pending
+            pending, n_detect = [], 0
+    if pending:
+        yield pending
+
+
+def _axis_starts(lo, hi, tile, overlap):
+    """[lo, hi) 구간을 overlap 이상 겹치는 tile 크기 구간들로 덮는 시작 위치"""
+    length = hi - lo
+    if length <= tile:
+        return [lo]
+    n = int(np.ceil((length - overlap) / (tile - overlap)))
+    return np.linspace(lo, hi - tile, n).round().astype(int).tolist()
+
+
+def layout_tiles(slot_bboxes, frame_shape, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """슬롯이 배치된 영역(슬롯 bbox 합집합 + 여백)만 덮는 겹치는 타일 (N, 4)
+    슬롯 배치가 고정이므로 타일 수(= 프레임당 추론 비용)도 고정된다"""
+    h, w = frame_shape[:2]
+    if len(slot_bboxes):
+        x1, y1 = np.floor(slot_bboxes[:, :2].min(axis=0) - overlap).astype(int)
+        x2, y2 = np.ceil(slot_bboxes[:, 2:].max(axis=0) + overlap).astype(int)
+        x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)
+    else:
+        x1, y1, x2, y2 = 0, 0, w, h
+
+    tiles = []
+    for ty in _axis_starts(y1, y2, tile, overlap):
+        for tx in _axis_starts(x1, x2, tile, overlap):
+            tiles.append((tx, ty, min(tx + tile, w), min(ty + tile, h)))
+    return np.array(tiles, dtype=np.int32)
+
+
+def predict_tiled(model, frames, tiles, imgsz, conf,
+                  iou_threshold=TILE_NMS_IOU, ios_threshold=TILE_NMS_IOS):
+    """모든 프레임의 모든 타일을 predict 한 번으로 추론하고, 프레임별로 타일 간 NMS 로 합침
+    -> 프레임별 (C, 4) 박스 배열 목록"""
+    if not frames:
+        return []
+    crops = [frame[y1:y2, x1:x2] for frame in frames for x1, y1, x2, y2 in tiles.tolist()]
+    results = model.predict(crops, imgsz=imgsz, conf=conf, classes=[0], verbose=False)
+
+    offsets = np.concatenate([tiles[:, :2], tiles[:, :2]], axis=1).astype(np.float64)
+    merged = []
+    for i in range(len(frames)):
+        boxes, scores = [], []
+        for t, r in enumerate(results[i * len(tiles):(i + 1) * len(tiles)]):
+            if len(r.boxes):
+                boxes.append(r.boxes.xyxy.cpu().numpy() + offsets[t])
+                scores.append(r.boxes.conf.cpu().numpy())
+        if not boxes:
+            merged.append(np.zeros((0, 4), dtype=np.int32))
+            continue
+        boxes = np.concatenate(boxes)
+        scores = np.concatenate(scores)
+        keep = nms(boxes, scores, iou_threshold, ios_threshold)
+        merged.append(boxes[keep].astype(np.int32))
+    return merged
+
+
+def predict_boxes(model, frames, imgsz, conf):
+    """프레임 여러 장을 predict 한 번으로 추론 -> 프레임별 (C, 4) 박스 배열 목록 (입력 순서 그대로)"""
+    if not frames:
+        return []
+    results = model.predict(frames, imgsz=imgsz, conf=conf, classes=[0], verbose=False)
+    return [boxes_from_results([r]) for r in results]
+
+
+def roi_tiles(slot_bboxes, changed, frame_shape, tile=ROI_TILE, pad=ROI_PAD):
+    """바뀐 슬롯을 tile 격자 칸 단위로 묶어서 잘라낼 영역 (N, 4) 배열로 돌려줌
+    같은 칸에 중심이 있는 슬롯끼리는 bbox 를 합쳐 하나의 영역으로 만든다"""
+    h, w = frame_shape[:2]
+    bboxes = slot_bboxes[np.asarray(changed, dtype=bool)]
+    if len(bboxes) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+
+    centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+    cells = (centers // tile).astype(np.int64)
+    _, group = np.unique(cells, axis=0, return_inverse=True)
+    group = group.ravel()
+
+    n = group.max() + 1
+    x1 = np.full(n, np.inf)
+    y1 = np.full(n, np.inf)
+    x2 = np.full(n, -np.inf)
+    y2 = np.full(n, -np.inf)
+    np.minimum.at(x1, group, bboxes[:, 0])
+    np.minimum.at(y1, group, bboxes[:, 1])
+    np.maximum.at(x2, group, bboxes[:, 2])
+    np.maximum.at(y2, group, bboxes[:, 3])
+
+    rects = np.stack([x1 - pad, y1 - pad, x2 + pad, y2 + pad], axis=1)
+    rects = np.clip(rects, 0, [w, h, w, h]).astype(np.int32)
+    return rects[(rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1])]
+
+
+def predict_rois(model, frame, rects, imgsz, conf):
+    """잘라낸 영역들을 한 번에 추론하고 박스를 원본 프레임 좌표로 되돌림 -> 영역별 (C, 4) 배열 목록"""
+    crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects.tolist()]
+    boxes_per_crop = predict_boxes(model, crops, imgsz, conf)
+    return [boxes + np.array([x1, y1, x1, y1], dtype=np.int32)
+            for boxes, (x1, y1, _, _) in zip(boxes_per_crop, rects.tolist())]
+
+
+def _centers_in_rects(boxes, rects):
+    centers = box_centers(boxes)
+    if len(centers) == 0 or len(rects) == 0:
+        return np.zeros(len(centers), dtype=bool)
+    c = centers[:, None, :]
+    r = rects[None, :, :]
+    return ((c[..., 0] >= r[..., 0]) & (c[..., 0] < r[..., 2]) &
+            (c[..., 1] >= r[..., 1]) & (c[..., 1] < r[..., 3])).any(axis=1)
+
+
+class RoiDetector:
+    """바뀐 슬롯 주변만 잘라서 재감지하고, 그 영역의 차량 박스와 슬롯 점유만 갱신
+    FULL_REFRESH_EVERY 번마다, 또는 바뀐 슬롯이 많으면 전체 프레임 감지로 되돌아간다"""
+
+    def __init__(self, model, slot_engine, gate, imgsz, conf, roi_imgsz=ROI_IMGSZ,
+                 full_every=FULL_REFRESH_EVERY, max_changed=ROI_MAX_CHANGED):
+        self.model = model
+        self.slot_engine = slot_engine
+        self.gate = gate
+        self.imgsz = imgsz
+        self.conf = conf
+        self.roi_imgsz = roi_imgsz
+        self.full_every = full_every
+        self.max_changed = max_changed
+
+        self.car_boxes = np.zeros((0, 4), dtype=np.int32)
+        self.occupied = np.zeros(len(slot_engine), dtype=bool)
+        self.since_full = None
+        self.counts = {"skip": 0, "roi": 0, "full": 0, "roi_tiles": 0}
+
+    def update(self, frame):
+        """프레임 하나 처리 -> (차량 박스, 슬롯 점유, "skip" | "roi" | "full")"""
+        if not self.gate.should_detect(frame):
+            self.counts["skip"] += 1
+            return self.car_boxes, self.occupied, "skip"
+
+        changed = self.gate.changed_slots
+        if (self.since_full is None or self.since_full + 1 >= self.full_every
+                or len(changed) == 0 or changed.mean() > self.max_changed):
+            return self._full(frame)
+
+        rects = roi_tiles(self.slot_engine.bboxes, changed, frame.shape)
+        if len(rects) == 0:
+            return self._full(frame)
+
+        new_boxes = np.concatenate(predict_rois(self.model, frame, rects, self.roi_imgsz, self.conf))
+        # 영역 안에 중심이 있는 기존 박스는 새 결과로 교체 (겹친 영역의 중복 박스는 한 번만)
+        keep = ~_centers_in_rects(self.car_boxes, rects)
+        new_boxes = _dedupe_boxes(new_boxes)
+        self.car_boxes = np.concatenate([self.car_boxes[keep], new_boxes]).astype(np.int32)
+
+        affected = self.slot_engine.slots_in_rects(rects)
+        self.occupied = self.occupied.copy()
+        self.occupied[affected] = self.slot_engine.subset_occupancy(affected, self.car_boxes)
+
+        self.since_full += 1
+        self.counts["roi"] += 1
+        self.counts["roi_tiles"] += len(rects)
+        return self.car_boxes, self.occupied, "roi"
+
+    def _full(self, frame):
+        self.car_boxes = predict_boxes(self.model, [frame], self.imgsz, self.conf)[0]
+        self.occupied = self.slot_engine.occupancy(self.car_boxes, frame.shape)
+        self.since_full = 0
+        self.counts["full"] += 1
+        return self.car_boxes, self.occupied, "full"
+
+
+def _dedupe_boxes(boxes, iou_threshold=0.6):
+    """겹치는 ROI 에서 같은 차량이 두 번 잡힌 박스 제거"""
+    if len(boxes) < 2:
+        return boxes
+    keep = nms(boxes, np.ones(len(boxes)), iou_threshold)
+    return boxes[keep]
+
+
+def nms(boxes, scores, iou_threshold, ios_threshold=None):
+    """NumPy NMS: 점수 높은 순으로 IoU 가 iou_threshold 를 넘는 박스 제거 -> 남길 인덱스
+    ios_threshold: 교차 넓이 / 작은 박스 넓이 가 이 이상이어도 제거 (타일 경계에서 잘린 박스)"""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    x1, y1, x2, y2 = boxes.T
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+        ih = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+        suppress = iou > iou_threshold
+        if ios_threshold is not None:
+            ios = inter / (np.minimum(areas[i], areas[rest]) + 1e-6)
+            suppress |= ios >= ios_threshold
+        order = rest[~suppress]
+    return np.array(keep, dtype=np.int64)
+
+
+class ThroughputMeter:
+    """배치 추론 처리량 집계"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.frames = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def add(self, n_frames, seconds):
+        self.frames += n_frames
+        self.batches += 1
+        self.seconds += seconds
+
+    def summary(self):
+        fps = self.frames / self.seconds if self.seconds > 0 else 0.0
+        batch_ms = self.seconds * 1000 / self.batches if self.batches else 0.0
+        return {
+            "batch_size": self.batch_size,
+            "frames": self.frames,
+            "batches": self.batches,
+            "inference_sec": round(self.seconds, 3),
+            "fps": round(fps, 2),
+            "batch_ms": round(batch_ms, 2),
+        }
+
+
+def measure_batch_sizes(model, frames, imgsz, conf, batch_sizes=(1, 2, 4, 8, 16)):
+    """같은 프레임들로 배치 크기별 처리량 측정 (장비별 BATCH_SIZE 선택용)"""
+    predict_boxes(model, frames[:1], imgsz, conf)  # 워밍업
+    report = []
+    for batch_size in batch_sizes:
+        meter = ThroughputMeter(batch_size)
+        for i in range(0, len(frames), batch_size):
+            batch = frames[i:i + batch_size]
+            t0 = time.perf_counter()
+            predict_boxes(model, batch, imgsz, conf)
+            meter.add(len(batch), time.perf_counter() - t0)
+        report.append(meter.summary())
+    return report
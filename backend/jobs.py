@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sources import is_uploading, uploading_marker
+
+MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # 동시에 분석할 영상 수 (프로세스당 모델 1개)
+MAX_PENDING = 16                                  # 대기 + 실행 중 작업 최대 개수
+JOB_TTL_SEC = int(os.environ.get("JOB_TTL_SEC", 24 * 3600))  # 끝난 작업 기록(결과 포함) 보관 시간
+MAX_FINISHED_JOBS = 100                           # 끝난 작업 기록 최대 개수 (넘으면 오래된 것부터 삭제)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _run_analysis(job_id, video_path, progress):
+    """작업 프로세스에서 실행: ai_module 오프라인 분석 + 진행률 공유"""
+    from ai_module import analyze_parking_video
+
+    def report(done, total):
+        progress[job_id] = (done, total)
+
+    return analyze_parking_video(video_path, progress=report)
+
+
+class JobManager:
+    """업로드된 영상별 분석 작업 큐
+    작업은 크기가 제한된 프로세스 풀에서 돌기 때문에 API 프로세스는 계속 응답할 수 있다.
+    끝난 작업의 영상 파일은 keep_video(경로) 가 True 가 아니면 (예: /stream 에서 재생 중) 삭제하고,
+    작업 기록은 ttl 이 지나거나 max_finished 개를 넘으면 지운다."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING,
+                 ttl=JOB_TTL_SEC, max_finished=MAX_FINISHED_JOBS, keep_video=None):
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.keep_video = keep_video
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.executor = None
+        self.progress = None
+
+    def _start(self):
+        # 스레드가 도는 API 프로세스에서 fork 하지 않도록 spawn 사용, 풀은 첫 작업 때 생성
+        if self.executor is None:
+            ctx = multiprocessing.get_context("spawn")
+            self.progress = ctx.Manager().dict()
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+
+    def submit(self, video_path, job_id=None):
+        with self.lock:
+            active = sum(1 for job in self.jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                raise QueueFullError(f"대기 중인 분석 작업이 너무 많습니다. ({active}/{self.max_pending})")
+
+            self._start()
+            job_id = job_id or uuid.uuid4().hex[:12]
+            job = {
+                "id": job_id,
+                "video_path": video_path,
+                "status": "queued",
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "video_deleted": False,
+            }
+            self.jobs[job_id] = job
+            future = self.executor.submit(_run_analysis, job_id, video_path, self.progress)
+
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return job_id
+
+    def _finish(self, job_id, future):
+        with self.lock:
+            job = self.jobs[job_id]
+            job["finished_at"] = time.time()
+            try:
+                job["result"] = future.result()
+                job["status"] = "done" if job["result"] else "failed"
+                if not job["result"]:
+                    job["error"] = "영상 또는 슬롯 정보를 읽을 수 없습니다."
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+        self.cleanup()
+
+    def cleanup(self, now=None):
+        """끝난 작업의 영상 삭제 + 오래된 작업 기록 정리 -> 지운 기록 수"""
+        now = now or time.time()
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if job["finished_at"] is not None),
+                              key=lambda job: job["finished_at"])
+            expired = [job for job in finished if now - job["finished_at"] > self.ttl]
+            kept = [job for job in finished if now - job["finished_at"] <= self.ttl]
+            expired += kept[:max(len(kept) - self.max_finished, 0)]
+            for job in expired:
+                del self.jobs[job["id"]]
+            videos = [job for job in finished if not job["video_deleted"]]
+
+        if self.progress is not None:
+            for job in expired:
+                self.progress.pop(job["id"], None)
+        for job in videos:
+            path = job["video_path"]
+            # 아직 올라오는 중이거나 재생 중인 영상은 다음 정리 때
+            if is_uploading(path) or (self.keep_video is not None and self.keep_video(path)):
+                continue
+            for p in (path, uploading_marker(path)):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"영상 파일 삭제 실패: {p} ({e})")
+            job["video_deleted"] = True
+        return len(expired)
+
+    def video_paths(self):
+        """기록이 남아 있는 작업들의 영상 경로"""
+        with self.lock:
+            return {job["video_path"] for job in self.jobs.values()}
+
+    def get(self, job_id):
+        """작업 상태 (결과 제외) 또는 None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            info = {k: v for k, v in job.items() if k != "result"}
+
+        done, total = self.progress.get(job_id, (0, 0)) if self.progress is not None else (0, 0)
+        if info["status"] == "queued" and done > 0:
+            info["status"] = "running"
+        if info["status"] == "done":
+            info["progress"] = 1.0
+        else:
+            info["progress"] = round(min(done / total, 1.0), 3) if total else 0.0
+        info["frames_done"] = done
+        return info
+
+    def result(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else job["result"]
+
+    def list(self):
+        with self.lock:
+            ids = list(self.jobs)
+        return [self.get(job_id) for job_id in ids]
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,12 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 from ai_module import load_slots
+from occupancy import SlotOccupancy
+from stream_pipeline import AnalysisSession, OccupancyFeed
+from sources import UPLOADING_SUFFIX, LatestFrameReader
+from scheduler import InferenceScheduler
+from database import GRAINS, open_history, open_writer
+from encoder import JpegEncoder
+from overlay import SlotOverlay
+from detectors import LazyDetector
+from motion import MotionGate
+from jobs import JobManager, QueueFullError
+from uploads import (EARLY_START_BYTES, MAX_UPLOAD_BYTES, UploadError, begin_upload,
+                     finish_upload, received_bytes, stream_to_file)
+from tracker import OccupancyTracker
+from inference import TILE_SIZE, RoiDetector, layout_tiles, predict_tiled
 import os
-import shutil
+import json
+import time
+import threading
+import uuid
 import cv2
 import numpy as np
-from ultralytics import YOLO
 
 app = FastAPI()
 
@@ -22,121 +40,636 @@ app.add_middleware(
 UPLOAD_FOLDER = "temp_videos"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-model = YOLO("best.pt")
-slots = load_slots("slots.csv")
+SLOTS_CSV = "slots.csv"
+# 점유 판정 규칙: "center" | "iou" | "overlap" (임계값 None이면 규칙별 기본값)
+OCCUPANCY_RULE = "center"
+OCCUPANCY_THRESHOLD = None
+# 슬롯 라벨 이미지(해상도별 디스크 캐시)로 중심점 -> 슬롯 조회 (center 규칙에서만 사용)
+USE_LABEL_MAP = True
+# 변화가 없어도 이 프레임 수마다 한 번은 YOLO 감지
+MOTION_MAX_SKIP = 30
+# 바뀐 슬롯 주변 영역만 잘라서 재감지 (주기적으로 전체 프레임 감지)
+USE_ROI_RECHECK = False
+# 고해상도(4K 등) 영상: 슬롯 배치 영역을 겹치는 타일로 나눠 원본 해상도로 추론
+USE_TILED_INFERENCE = False
+# 슬롯 상태를 바꾸기 전에 필요한 연속 동일 감지 횟수
+CONFIRM_FRAMES = 3
+# 실시간 카메라 목록 (없으면 업로드 영상만 분석), 형식은 cameras.example.json 참고
+CAMERAS_FILE = os.environ.get("CAMERAS_FILE", "cameras.json")
+# 점유 이력 저장: "mysql" (database.DB_CONFIG, 커넥션 풀) | "sqlite:///경로" | "" (저장 안 함)
+PARKING_DB = os.environ.get("PARKING_DB", "mysql")
+# 스트림 JPEG 화질 / 최대 가로 크기(0 이면 원본) / 인코더 ("auto" 면 libjpeg-turbo 가 있을 때 사용)
+STREAM_JPEG_QUALITY = int(os.environ.get("STREAM_JPEG_QUALITY", 80))
+STREAM_MAX_WIDTH = int(os.environ.get("STREAM_MAX_WIDTH", 0))
+STREAM_ENCODER = os.environ.get("STREAM_ENCODER", "auto")
+# 주차장별 점유 집계(총 슬롯 / 점유 / 차량 수)를 저장하는 간격 (초)
+DB_SAMPLE_SEC = 60
 
-latest_analysis_result = {
-    "vehicles": [{"type": "car", "count": 0}],
-    "spaces": [{"id": i+1, "occupied": 0} for i in range(len(slots))]
-}
+# 서버 시작 시 감지 모델을 백그라운드에서 미리 로드 + 워밍업 ("0" 이면 첫 감지 때 로드)
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "1") != "0"
+
+# 감지 모델: DETECTOR_BACKEND 환경 변수로 ultralytics(best.pt) / onnx / openvino 선택
+# import 할 때는 만들지 않고 처음 필요할 때 로드 (모델이 필요 없는 요청은 기다리지 않음)
+detector = LazyDetector()
+# 모든 세션(업로드 영상 + 카메라)의 전체 프레임 감지를 모아서 모델 하나로 배치 추론
+scheduler = InferenceScheduler(detector, imgsz=640, conf=0.25)
+# 점유 변화 이벤트 / 주기 집계를 백그라운드에서 묶어서 기록 (분석 루프는 기다리지 않음)
+db_writer = open_writer(PARKING_DB)
+# 이력 조회는 분/시/일 집계 테이블에서만 (원본 이벤트는 읽지 않음)
+history = open_history(PARKING_DB)
+HISTORY_DEFAULT_DAYS = 30
+
+def make_lot(slots_csv):
+    """주차장(카메라) 하나의 슬롯 정보 + 점유 계산기 + 최신 분석 결과"""
+    lot_slots = load_slots(slots_csv)
+    engine = SlotOccupancy(lot_slots, csv_path=slots_csv, use_label_map=USE_LABEL_MAP,
+                           rule=OCCUPANCY_RULE, threshold=OCCUPANCY_THRESHOLD)
+    return {
+        "slots": lot_slots,
+        "engine": engine,
+        # 점유 상태 bool 배열 + 변경 순번 (/parking_spaces, /bitmap, /events 가 모두 여기서 읽음)
+        "feed": OccupancyFeed(len(lot_slots)),
+    }
+
+# 업로드 영상용 기본 주차장 (처음 필요할 때 slots.csv 를 읽음)
+_main_lot = None
+_main_lot_lock = threading.Lock()
+
+def get_main_lot():
+    global _main_lot
+    if _main_lot is None:
+        with _main_lot_lock:
+            if _main_lot is None:
+                _main_lot = make_lot(SLOTS_CSV)
+    return _main_lot
+
+cameras = {}  # cam_id -> {"reader", "lot", "session"}
+current_session = None
+session_lock = threading.Lock()
+current_video_path = None
+
+def is_active_video(path):
+    return path == current_video_path
+
+# 끝난 작업의 영상은 /stream 에서 재생 중이 아니면 삭제, 작업 기록은 JOB_TTL_SEC 후 삭제
+job_manager = JobManager(keep_video=is_active_video)
+pending_uploads = {}  # 이어 올리기 중인 업로드 (upload_id = job_id)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# 이어 올리기가 이 시간 동안 멈춰 있으면 버린 업로드로 보고 삭제 (업로드 폴더의 주인 없는 파일도)
+UPLOAD_IDLE_SEC = int(os.environ.get("UPLOAD_IDLE_SEC", 6 * 3600))
+CLEANUP_EVERY_SEC = 600
+cleanup_stop = threading.Event()
+
+def new_upload_path(filename):
+    """업로드마다 작업 ID 와 별도 파일 경로 (확장자만 원본 파일명에서 가져옴)"""
+    job_id = uuid.uuid4().hex[:12]
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext[1:].isalnum() or len(ext) > 6:
+        ext = ".mp4"
+    return job_id, os.path.join(UPLOAD_FOLDER, f"{job_id}{ext}")
+
+async def submit_job(file_path, job_id):
+    # 첫 작업은 spawn 프로세스 풀 / Manager 를 띄우느라 오래 걸리므로 스레드풀에서
+    try:
+        await run_in_threadpool(job_manager.submit, file_path, job_id=job_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+async def activate_video(file_path):
+    """새 영상이 올라오면 기존 분석 세션 종료, /stream 은 가장 최근 업로드 영상을 보여줌"""
+    global current_video_path
+    await run_in_threadpool(stop_session)
+    current_video_path = file_path
+    # 이전 영상의 분석이 끝났으면 이제 지워도 됨
+    await run_in_threadpool(job_manager.cleanup)
+
+async def receive_upload(chunks, file_path, job_id, offset=0, start_early=False, started=False):
+    """청크를 파일에 바로 쓰고, start_early 면 앞부분이 EARLY_START_BYTES 만큼 쌓였을 때 분석 시작
+    -> (받은 바이트 수, 분석 시작 여부)"""
+    async def on_progress(received):
+        nonlocal started
+        if start_early and not started and received >= EARLY_START_BYTES:
+            try:
+                await run_in_threadpool(job_manager.submit, file_path, job_id=job_id)
+                started = True
+            except QueueFullError:
+                pass  # 업로드가 끝날 때 다시 시도
+
+    try:
+        size = await stream_to_file(chunks, file_path, offset=offset, on_progress=on_progress)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ClientDisconnect:
+        raise HTTPException(status_code=400, detail="업로드 중 연결이 끊겼습니다.")
+    return size, started
+
+async def _upload_file_chunks(file):
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
 
 @app.post("/analyze")
 async def upload_video(file: UploadFile = File(...)):
+    job_id, file_path = new_upload_path(file.filename)
+    # 이벤트 루프를 막지 않도록 청크 단위로 읽고 쓰기는 스레드풀에서
     try:
-        file_path = os.path.join(UPLOAD_FOLDER, "current.mp4")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        return {"message": "영상 업로드 완료", "file": "current.mp4"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"업로드 실패: {e}")
-
-# 오버레이 함수
-def draw_overlay(frame, car_boxes, slots):
-    for idx, pts in enumerate(slots):
-        pts_np = np.array(pts, dtype=np.int32)
-        occupied = False
-        for (x1, y1, x2, y2) in car_boxes:
-            cx, cy = (x1 + x2)//2, (y1 + y2)//2
-            if cv2.pointPolygonTest(pts_np, (cx, cy), False) >= 0:
-                occupied = True
+        await receive_upload(_upload_file_chunks(file), file_path, job_id)
+    except HTTPException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    # 업로드마다 별도 파일 + 작업 ID, 오프라인 분석은 프로세스 풀에서 진행
+    try:
+        await submit_job(file_path, job_id)
+    except HTTPException:
+        os.remove(file_path)
+        raise
+
+    await activate_video(file_path)
+    return {"message": "영상 업로드 완료", "file": os.path.basename(file_path), "job_id": job_id}
+
+# 요청 본문(영상 바이트)을 그대로 작업 파일에 흘려 씀 (multipart 임시 사본 없음)
+@app.post("/analyze/stream")
+async def upload_video_stream(request: Request, filename: str = "video.mp4", start_early: bool = False):
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"업로드 크기 제한({MAX_UPLOAD_BYTES} 바이트)을 넘었습니다.")
+
+    job_id, file_path = new_upload_path(filename)
+    begin_upload(file_path)
+    started = False
+    try:
+        size, started = await receive_upload(request.stream(), file_path, job_id, start_early=start_early)
+    except HTTPException:
+        finish_upload(file_path)
+        if not started and os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finish_upload(file_path)
+
+    if not started:
+        await submit_job(file_path, job_id)
+    await activate_video(file_path)
+    return {"message": "영상 업로드 완료", "file": os.path.basename(file_path), "job_id": job_id, "bytes": size}
+
+# 이어 올리기: POST /uploads -> PUT /uploads/{id}?offset=N (여러 번) -> POST /uploads/{id}/complete
+@app.post("/uploads")
+def create_upload(filename: str = "video.mp4", size: int = 0):
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"업로드 크기 제한({MAX_UPLOAD_BYTES} 바이트)을 넘었습니다.")
+    job_id, file_path = new_upload_path(filename)
+    begin_upload(file_path)
+    pending_uploads[job_id] = {"path": file_path, "size": size, "started": False, "created_at": time.time()}
+    return {"upload_id": job_id, "received": 0}
+
+def _get_upload(upload_id):
+    upload = pending_uploads.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="업로드를 찾을 수 없습니다.")
+    return upload
+
+@app.get("/uploads/{upload_id}")
+def upload_status(upload_id: str):
+    upload = _get_upload(upload_id)
+    return {"upload_id": upload_id, "received": received_bytes(upload["path"]), "size": upload["size"],
+            "analysis_started": upload["started"]}
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = 0, start_early: bool = False):
+    upload = _get_upload(upload_id)
+    received, upload["started"] = await receive_upload(
+        request.stream(), upload["path"], upload_id, offset=offset,
+        start_early=start_early, started=upload["started"])
+    return {"upload_id": upload_id, "received": received, "analysis_started": upload["started"]}
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    upload = _get_upload(upload_id)
+    received = received_bytes(upload["path"])
+    if upload["size"] and received != upload["size"]:
+        raise HTTPException(status_code=409, detail=f"아직 {received}/{upload['size']} 바이트만 받았습니다.")
+
+    finish_upload(upload["path"])
+    if not upload["started"]:
+        await submit_job(upload["path"], upload_id)
+        upload["started"] = True
+    pending_uploads.pop(upload_id, None)
+    await activate_video(upload["path"])
+    return {"message": "영상 업로드 완료", "file": os.path.basename(upload["path"]), "job_id": upload_id,
+            "bytes": received}
+
+@app.get("/jobs")
+def list_jobs():
+    return job_manager.list()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    info = job_manager.get(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return info
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    info = job_manager.get(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    if info["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"분석이 끝나지 않았습니다. (상태: {info['status']})")
+    return job_manager.result(job_id)
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"파일 삭제 실패: {path} ({e})")
+
+def cleanup_uploads(now=None):
+    """멈춘 이어 올리기 / 끝난 작업 영상 / 업로드 폴더의 주인 없는 파일 정리"""
+    now = now or time.time()
+    for upload_id, upload in list(pending_uploads.items()):
+        path = upload["path"]
+        last = os.path.getmtime(path) if os.path.exists(path) else upload["created_at"]
+        if now - last <= UPLOAD_IDLE_SEC:
+            continue
+        print(f"멈춘 업로드 삭제: {upload_id}")
+        pending_uploads.pop(upload_id, None)
+        finish_upload(path)
+        # 미리 분석을 시작한 업로드는 작업이 끝난 뒤 job_manager 가 지움
+        if not upload["started"] and not is_active_video(path):
+            _remove_file(path)
+    job_manager.cleanup(now)
+
+    # 재시작 전 업로드 등 어떤 작업 / 업로드에도 속하지 않은 파일
+    known = job_manager.video_paths() | {u["path"] for u in pending_uploads.values()}
+    if current_video_path is not None:
+        known.add(current_video_path)
+    for name in os.listdir(UPLOAD_FOLDER):
+        path = os.path.join(UPLOAD_FOLDER, name)
+        video = path[:-len(UPLOADING_SUFFIX)] if path.endswith(UPLOADING_SUFFIX) else path
+        if video in known or not os.path.isfile(path):
+            continue
+        if now - os.path.getmtime(path) > UPLOAD_IDLE_SEC:
+            _remove_file(path)
+
+@app.on_event("startup")
+def start_cleanup():
+    def run():
+        while True:
+            try:
+                cleanup_uploads()
+            except Exception as e:
+                print(f"업로드 정리 실패: {e}")
+            if cleanup_stop.wait(CLEANUP_EVERY_SEC):
                 break
-        
-        slot_color = (0, 0, 255) if occupied else (0, 255, 0)
-        cv2.polylines(frame, [pts_np], True, slot_color, 2)
-        cv2.putText(frame, str(idx + 1), pts[0], cv2.FONT_HERSHEY_SIMPLEX, 0.6, slot_color, 2)
 
-    for (x1, y1, x2, y2) in car_boxes:
+    threading.Thread(target=run, daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    cleanup_stop.set()
+    job_manager.shutdown()
+
+# 오버레이 함수 (occupied: 슬롯별 점유 bool 배열)
+# 슬롯 외곽선 / 번호는 미리 그려 둔 레이어(SlotOverlay)를 합성, 차량 박스만 매번 그림
+def draw_overlay(frame, car_boxes, overlay, occupied):
+    overlay.render(frame, occupied)
+
+    for (x1, y1, x2, y2) in np.asarray(car_boxes, dtype=np.int32).reshape(-1, 4).tolist():
         cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
     
     return frame
 
+# 영상(또는 카메라) 하나당 분석 세션 하나 (YOLO 추론 / 인코딩은 시청자 수와 무관하게 한 번만)
+# live=True 면 source 는 LatestFrameReader, 해상도는 첫 프레임에서 정하고 시간은 실제 시각 기준
+# cam_id: 스케줄러에서 이 세션을 구분하는 이름, priority 가 클수록 요청이 몰릴 때 먼저 추론
+def create_session(source, speed, lot, live=False, cam_id="upload", priority=1.0):
+    lot_slots, engine = lot["slots"], lot["engine"]
+    scheduler.add_camera(cam_id, priority)
+    if live:
+        fps = source.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_shape = None
+    else:
+        cap = cv2.VideoCapture(source)
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap.release()
+        # 해상도별 슬롯 라벨 이미지를 미리 준비 (디스크 캐시가 있으면 바로 로드)
+        if engine.use_label_map:
+            engine.label_map(frame_shape)
+    tiles = None
+    if USE_TILED_INFERENCE and frame_shape is not None:
+        tiles = layout_tiles(engine.bboxes, frame_shape)
+
+    # 고정 간격 대신 슬롯 영역에 변화가 있을 때만 감지 (MOTION_MAX_SKIP 마다 한 번은 강제 감지)
+    gate = MotionGate(lot_slots, max_skip=MOTION_MAX_SKIP)
+    # 모델은 스케줄러 스레드에서만 호출 (타일 / ROI 감지도 스케줄러를 거침)
+    model = scheduler.model_for(cam_id)
+    # 바뀐 슬롯 주변만 잘라서 재감지하는 모드
+    roi_detector = RoiDetector(model, engine, gate, 640, 0.25) if USE_ROI_RECHECK else None
+    # 감지 결과가 CONFIRM_FRAMES 번 연속 같아야 슬롯 상태를 바꿈 (깜빡임 방지)
+    tracker = OccupancyTracker(len(lot_slots), confirm=CONFIRM_FRAMES)
+    last_car_boxes = None
+    overlay = None  # 해상도를 알게 되면 (첫 프레임) 생성
+    video_time = 0.0
+    started_at = time.time()
+    last_sample = 0.0
+
+    # 추론 단계: YOLO 감지(변화가 있을 때만) + 점유 계산 + 시각화
+    def process(frame, frame_index):
+        nonlocal last_car_boxes, video_time, tiles, last_sample, overlay
+        video_time = time.time() - started_at if live else frame_index / fps
+        scheduler.count_frame(cam_id)
+        if USE_TILED_INFERENCE and tiles is None:
+            tiles = layout_tiles(engine.bboxes, frame.shape[:2])
+
+        if roi_detector is not None:
+            car_boxes, observed, mode = roi_detector.update(frame)
+            detected = mode != "skip"
+        else:
+            detected = gate.should_detect(frame)
+            if detected:
+                # YOLO 감지 (전체 프레임은 다른 카메라 요청과 묶어서 배치 추론)
+                if tiles is not None:
+                    last_car_boxes = predict_tiled(model, [frame], tiles, TILE_SIZE, 0.25)[0]
+                else:
+                    last_car_boxes = scheduler.detect(cam_id, frame)
+                # 슬롯 x 차량 점유 행렬을 한 번에 계산
+                observed = engine.occupancy(last_car_boxes, frame.shape)
+            car_boxes = last_car_boxes
+
+        # 새 감지 결과가 있을 때만 상태 머신 갱신, 화면/결과는 확정된 상태 사용
+        if detected:
+            flipped = tracker.update(observed, video_time)
+            if db_writer is not None and len(flipped):
+                db_writer.add_events(cam_id, time.time(), flipped + 1, tracker.state[flipped])
+            # 확정 대기 중인 슬롯이 있으면 화면이 멈춰 있어도 다음 프레임을 다시 감지
+            pending = tracker.pending
+            if pending.any():
+                gate.force_next(pending)
+        occupied = tracker.state
+        now = time.time()
+        if db_writer is not None and now - last_sample >= DB_SAMPLE_SEC:
+            last_sample = now
+            db_writer.add_sample(cam_id, now, len(occupied), int(occupied.sum()), len(car_boxes))
+        # 프레임마다 dict 목록을 만들지 않고 배열만 비교 (바뀌었을 때만 순번 증가)
+        lot["feed"].update(occupied, len(car_boxes))
+
+        # 시각화
+        if overlay is None or overlay.shape != frame.shape[:2]:
+            overlay = SlotOverlay(lot_slots, frame.shape)
+        return draw_overlay(frame, car_boxes, overlay, occupied)
+
+    # 인코딩 단계 (세션당 한 번, 시청자 수와 무관)
+    encoder = JpegEncoder(STREAM_JPEG_QUALITY, STREAM_MAX_WIDTH, STREAM_ENCODER)
+
+    # 디코딩 / 추론 / 인코딩을 각각 스레드로 돌려 겹쳐서 처리
+    # speed가 2면 2프레임마다 1번 처리 (즉 2배 빠름), 3이면 3배 빠름
+    session = AnalysisSession(source, process, encoder.multipart, speed=speed, live=live,
+                              stats_fn=lambda: {"motion": gate.summary(),
+                                                "turnovers": int(tracker.turnovers.sum()),
+                                                "encoder": encoder.summary(),
+                                                "roi": dict(roi_detector.counts) if roi_detector else None})
+    # 슬롯별 회전 수 / 주차 시간 통계 (영상 시간 기준, 실시간이면 세션 시작 후 경과 시간)
+    session.slot_stats = lambda: tracker.slot_stats(video_time)
+    return session.start()
+
+
+def stop_session():
+    global current_session
+    with session_lock:
+        if current_session is not None:
+            current_session.stop()
+            current_session = None
+
+
 # 분석 데이터 업데이트 및 속도 조절
 @app.get("/stream")
 def stream_video(speed: int = 1): # speed 쿼리 파라미터 추가 (기본 1배속)
-    video_path = os.path.join(UPLOAD_FOLDER, "current.mp4")
-    if not os.path.exists(video_path):
+    global current_session
+    video_path = current_video_path
+    if video_path is None or not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail="업로드된 영상이 없습니다.")
 
-    cap = cv2.VideoCapture(video_path)
-    
-    detect_interval = 5
-    # 영상 속도 조절을 위한 변수
-    # speed가 2면 2프레임마다 1번 처리 (즉 2배 빠름), 3이면 3배 빠름
-    skip_frames = speed 
-    last_car_boxes = []
-    
-    def generate():
-        nonlocal last_car_boxes
-        global latest_analysis_result # 전역 변수 사용 선언
-        frame_count = 0
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # 현재 프레임이 skip_frames의 배수가 아니면 건너뜀 (처리 안 함 -> 빨라짐)
-            if speed > 1 and frame_count % skip_frames != 0:
-                continue
-
-            if frame_count == 1 or frame_count % detect_interval == 0:
-            # YOLO 감지
-                results = model.predict(frame, imgsz=640, conf=0.25, classes=[0], verbose=False)
-
-            car_boxes = []
-            for r in results:
-                for box in r.boxes.xyxy.tolist():
-                    x1, y1, x2, y2 = map(int, box)
-                    car_boxes.append((x1, y1, x2, y2))
-            
-            last_car_boxes = car_boxes
-
-            spaces_status = []
-            for idx, pts in enumerate(slots):
-                pts_np = np.array(pts, dtype=np.int32)
-                occupied = 0
-                for (x1, y1, x2, y2) in car_boxes:
-                    cx, cy = (x1 + x2)//2, (y1 + y2)//2
-                    if cv2.pointPolygonTest(pts_np, (cx, cy), False) >= 0:
-                        occupied = 1
-                        break
-                spaces_status.append({"id": idx+1, "occupied": occupied})
-
-            latest_analysis_result = {
-                "vehicles": [{"type": "car", "count": len(car_boxes)}],
-                "spaces": spaces_status
-            }
-            # ---------------------------------------------------------
-
-            # 시각화
-            frame = draw_overlay(frame, car_boxes, slots)
-            _, jpeg = cv2.imencode(".jpg", frame)
-            frame_bytes = jpeg.tobytes()
-
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-            )
+    with session_lock:
+        # 진행 중인 세션이 있으면 합류 (현재 재생 위치부터), 속도 변경은 모든 시청자에게 적용
+        if current_session is not None and current_session.running:
+            current_session.set_speed(speed)
+        else:
+            current_session = create_session(video_path, speed, get_main_lot())
+        session = current_session
 
     return StreamingResponse(
-        generate(),
+        session.broadcaster.subscribe(),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
+@app.get("/stream/stats")
+def stream_stats():
+    session = current_session
+    if session is None:
+        return {}
+    return session.snapshot()
+
+@app.get("/parking_spaces/stats")
+def parking_space_stats():
+    session = current_session
+    if session is None:
+        return {}
+    return session.slot_stats()
+
+def _not_modified(feed, request):
+    """If-None-Match 가 현재 순번과 같으면 304 (클라이언트는 본문 없이 이전 결과 재사용)"""
+    etag = feed.etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def feed_result(feed, request):
+    cached = _not_modified(feed, request)
+    if cached is not None:
+        return cached
+    seq, result = feed.result()
+    return JSONResponse(result, headers={"ETag": f'"{feed.epoch}-{seq}"'})
+
+def feed_bitmap(feed, request, format="base64"):
+    if format not in ("base64", "binary"):
+        raise HTTPException(status_code=400, detail="format 은 base64 또는 binary 입니다.")
+    cached = _not_modified(feed, request)
+    if cached is not None:
+        return cached
+    if format == "binary":
+        seq, bits = feed.bitmap()
+        return Response(bits, media_type="application/octet-stream",
+                        headers={"ETag": f'"{feed.epoch}-{seq}"', "X-Slot-Count": str(len(feed.state)),
+                                 "X-Seq": str(seq)})
+    body = feed.bitmap_json()
+    return JSONResponse(body, headers={"ETag": f'"{feed.epoch}-{body["seq"]}"'})
+
 @app.get("/parking_spaces")
-def parking_spaces():
+def parking_spaces(request: Request):
     # 더 이상 여기서 cv2.VideoCapture를 하지 않습니다.
     # 스트리밍 함수가 열심히 업데이트해 놓은 값을 그냥 가져갑니다.
-    return latest_analysis_result
+    return feed_result(get_main_lot()["feed"], request)
+
+# 점유 상태 비트맵: format=base64 (JSON) | binary (바이트 그대로, 슬롯 id 1 = 첫 바이트 최하위 비트)
+@app.get("/parking_spaces/bitmap")
+def parking_space_bitmap(request: Request, format: str = "base64"):
+    return feed_bitmap(get_main_lot()["feed"], request, format)
+
+
+async def sse_events(feed):
+    """OccupancyFeed -> Server-Sent Events (접속 시 snapshot 한 번, 이후 바뀐 슬롯만 delta)"""
+    async for event, message in feed.subscribe():
+        if event is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: {event}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+def sse_response(feed):
+    return StreamingResponse(sse_events(feed), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 폴링 대신 구독: 점유 상태가 바뀔 때만 바뀐 슬롯 id + 개수를 보냄
+@app.get("/parking_spaces/events")
+def parking_space_events():
+    return sse_response(get_main_lot()["feed"])
+
+# 모델 / 슬롯 정보는 시작을 막지 않고 백그라운드에서 미리 준비
+@app.on_event("startup")
+def preload_resources():
+    if not PRELOAD_MODEL:
+        return
+
+    def run():
+        try:
+            get_main_lot()
+        except Exception as e:
+            print(f"슬롯 파일 로드 실패: {e}")
+        detector.preload().join()
+
+    threading.Thread(target=run, daemon=True).start()
+
+# 프로세스가 살아 있으면 바로 200 (모델 로드를 기다리지 않음)
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+# 감지 모델 워밍업까지 끝났을 때만 200, 그 전에는 503 + 진행 상태
+@app.get("/ready")
+def ready():
+    body = {
+        "ready": detector.ready,
+        "model": detector.status(),
+        "slots": len(_main_lot["slots"]) if _main_lot is not None else None,
+    }
+    return JSONResponse(body, status_code=200 if detector.ready else 503)
+
+
+# 실시간 카메라: 카메라마다 최신 프레임만 읽는 스레드 + 자기 슬롯 파일로 분석 세션 하나
+def load_cameras(path=CAMERAS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+@app.on_event("startup")
+def start_cameras():
+    for cam_id, conf in load_cameras().items():
+        try:
+            lot = make_lot(conf.get("slots", SLOTS_CSV))
+        except Exception as e:
+            print(f"카메라 {cam_id} 슬롯 파일 로드 실패: {e}")
+            continue
+        reader = LatestFrameReader(conf["source"], replay=conf.get("replay", False))
+        session = create_session(reader, 1, lot, live=True, cam_id=cam_id,
+                                 priority=conf.get("priority", 1.0))
+        cameras[cam_id] = {"reader": reader, "lot": lot, "session": session}
+
+@app.on_event("shutdown")
+def stop_cameras():
+    for cam_id, cam in cameras.items():
+        cam["session"].stop()
+        cam["reader"].stop()
+        scheduler.remove_camera(cam_id)
+    cameras.clear()
+    stop_session()
+    scheduler.stop()
+    if db_writer is not None:
+        db_writer.stop()
+
+def _get_camera(cam_id):
+    cam = cameras.get(cam_id)
+    if cam is None:
+        raise HTTPException(status_code=404, detail="카메라를 찾을 수 없습니다.")
+    return cam
+
+@app.get("/live")
+def list_cameras():
+    return [{"id": cam_id, **cam["reader"].snapshot()} for cam_id, cam in cameras.items()]
+
+# 카메라별 실제 분석 속도(frame_rate / detect_rate)와 모델 사용률 -> 장비당 카메라 수 산정용
+@app.get("/live/scheduler")
+def scheduler_stats():
+    return scheduler.snapshot()
+
+@app.get("/live/{cam_id}/stream")
+def live_stream(cam_id: str):
+    cam = _get_camera(cam_id)
+    return StreamingResponse(
+        cam["session"].broadcaster.subscribe(),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
+
+@app.get("/live/{cam_id}/parking_spaces")
+def live_parking_spaces(cam_id: str, request: Request):
+    return feed_result(_get_camera(cam_id)["lot"]["feed"], request)
+
+@app.get("/live/{cam_id}/parking_spaces/bitmap")
+def live_parking_space_bitmap(cam_id: str, request: Request, format: str = "base64"):
+    return feed_bitmap(_get_camera(cam_id)["lot"]["feed"], request, format)
+
+@app.get("/live/{cam_id}/events")
+def live_parking_space_events(cam_id: str):
+    return sse_response(_get_camera(cam_id)["lot"]["feed"])
+
+@app.get("/live/{cam_id}/stats")
+def live_stats(cam_id: str):
+    cam = _get_camera(cam_id)
+    return {"reader": cam["reader"].snapshot(), **cam["session"].snapshot(),
+            "slots": cam["session"].slot_stats()}
+
+
+# 이력 조회: 주차장 id 는 카메라 id (업로드 영상은 "upload"), start / end 는 unix 초
+def _history_range(grain, start, end, days=HISTORY_DEFAULT_DAYS):
+    if history is None:
+        raise HTTPException(status_code=404, detail="점유 이력 저장이 꺼져 있습니다. (PARKING_DB)")
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain 은 {', '.join(GRAINS)} 중 하나입니다.")
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - days * 86400
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start 는 end 보다 앞이어야 합니다.")
+    return start, end
+
+@app.get("/history/{lot}/occupancy")
+def occupancy_history(lot: str, grain: str = "hour", start: float = None, end: float = None):
+    start, end = _history_range(grain, start, end)
+    return {"lot": lot, "grain": grain, "start": start, "end": end,
+            "buckets": history.occupancy(lot, grain, start, end)}
+
+# 최근 days 일 동안 시간대(0~23시)별 평균 점유율
+@app.get("/history/{lot}/occupancy/hourly")
+def occupancy_hourly_profile(lot: str, days: int = HISTORY_DEFAULT_DAYS):
+    start, end = _history_range("hour", None, None, days)
+    return {"lot": lot, "days": days, "hours": history.hourly_profile(lot, start, end)}
+
+@app.get("/history/{lot}/turnover")
+def turnover_history(lot: str, grain: str = "day", start: float = None, end: float = None):
+    start, end = _history_range(grain, start, end)
+    return {"lot": lot, "start": start, "end": end, "slots": history.turnover(lot, grain, start, end)}
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+from occupancy import build_label_map
+from tracker import CONFIRM_FRAMES
+
+MOTION_WIDTH = 160         # 차분 계산용 축소 영상 가로 크기
+PIXEL_THRESHOLD = 25       # 밝기 차이가 이 값보다 크면 변화 픽셀
+CHANGE_RATIO = 0.002       # 전체 화면 기준: 변화 픽셀 비율이 이 이상이면 재감지
+SLOT_CHANGE_RATIO = 0.05   # 슬롯 기준: 어느 한 슬롯의 변화 비율이 이 이상이면 재감지
+MAX_SKIP = 150             # 변화가 없어도 이 프레임 수마다 한 번은 감지
+# 변화로 감지한 뒤 화면이 멈춰도 이어서 감지할 프레임 수 (상태 머신이 CONFIRM_FRAMES 번 연속 관측하도록)
+FOLLOWUP_FRAMES = CONFIRM_FRAMES - 1
+
+
+class MotionGate:
+    """마지막 감지 프레임과의 축소 영상 차분으로, 변화가 있을 때만 YOLO 감지를 하도록 판단
+    slots 를 주면 슬롯 영역 안의 변화만 보고, 어떤 슬롯이 바뀌었는지도 changed_slots 로 알려준다.
+    변화가 멈춘 뒤에도 followup 프레임은 이어서 감지하고, force_next() 로 다음 프레임 감지를 요청할 수 있다
+    (상태 머신이 확인 중인 슬롯이 max_skip 까지 기다리지 않도록)"""
+
+    def __init__(self, slots=None, width=MOTION_WIDTH, pixel_threshold=PIXEL_THRESHOLD,
+                 change_ratio=CHANGE_RATIO, slot_change_ratio=SLOT_CHANGE_RATIO, max_skip=MAX_SKIP,
+                 followup=FOLLOWUP_FRAMES):
+        self.slots = slots
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.change_ratio = change_ratio
+        self.slot_change_ratio = slot_change_ratio
+        self.max_skip = max_skip
+        self.followup = followup
+
+        self.reference = None
+        self.since_detect = 0
+        self.followup_left = 0
+        self.followup_slots = None
+        self.forced = None        # force_next() 로 요청된 슬롯 (True 면 전체)
+        self.labels = None        # 축소 해상도 슬롯 라벨 이미지
+        self.slot_pixels = None   # 슬롯별 픽셀 수
+        self.changed_slots = np.zeros(len(slots) if slots else 0, dtype=bool)
+
+        self.frames = 0
+        self.detections = 0
+        self.skipped = 0
+        self.extra = 0            # 변화 없이 followup / force_next 로 감지한 프레임
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.width / w
+        small = cv2.resize(frame, (self.width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self.slots and self.labels is None:
+            scaled = [[(x * scale, y * scale) for x, y in pts] for pts in self.slots]
+            self.labels = build_label_map(scaled, gray.shape)
+            self.slot_pixels = np.maximum(np.bincount(self.labels.ravel(), minlength=len(self.slots) + 1), 1)
+        return gray
+
+    def should_detect(self, frame):
+        """이번 프레임에서 감지를 해야 하면 True (True 를 돌려준 프레임이 새 기준 프레임이 됨)"""
+        self.frames += 1
+        small = self._small(frame)
+
+        if self.reference is None or self.since_detect + 1 >= self.max_skip:
+            # 첫 프레임 / 강제 갱신: 전체 슬롯을 바뀐 것으로 간주
+            self.changed_slots[:] = True
+            return self._trigger(small)
+
+        diff = cv2.absdiff(small, self.reference) > self.pixel_threshold
+        if self.labels is not None:
+            counts = np.bincount(self.labels[diff], minlength=len(self.slots) + 1)
+            ratio = counts / self.slot_pixels
+            self.changed_slots = ratio[1:] >= self.slot_change_ratio
+            changed = self.changed_slots.any()
+        else:
+            changed = diff.mean() >= self.change_ratio
+
+        if changed:
+            self.followup_left = self.followup
+            self.followup_slots = self.changed_slots.copy()
+            if self.forced is not None:
+                self.changed_slots = self.changed_slots | self.forced
+            return self._trigger(small)
+
+        if self.forced is not None or self.followup_left > 0:
+            # 변화는 멈췄지만 방금 바뀐 슬롯 / 확정 대기 중인 슬롯을 다시 봄
+            self.changed_slots = np.zeros_like(self.changed_slots)
+            if self.followup_left > 0:
+                self.followup_left -= 1
+                self.changed_slots |= self.followup_slots
+            if self.forced is not None:
+                self.changed_slots |= self.forced
+            self.extra += 1
+            return self._trigger(small)
+
+        self.since_detect += 1
+        self.skipped += 1
+        return False
+
+    def force_next(self, slot_mask=True):
+        """다음 프레임은 변화가 없어도 감지 (slot_mask: 다시 볼 슬롯, True 면 전체)"""
+        if slot_mask is True or self.forced is True or not self.slots:
+            self.forced = True
+        elif self.forced is None:
+            self.forced = np.array(slot_mask, dtype=bool)
+        else:
+            self.forced |= np.asarray(slot_mask, dtype=bool)
+
+    def _trigger(self, small):
+        self.forced = None
+        self.reference = small
+        self.since_detect = 0
+        self.detections += 1
+        return True
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "skipped": self.skipped,
+            "followup": self.extra,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
@@ -0,0 +1,345 @@
+import os
+import hashlib
+import cv2
+import numpy as np
+
+SLOT_CACHE_DIR = "slot_cache"
+SHARED_LABEL = -1  # 라벨 이미지에서 슬롯 두 개 이상이 겹치는 픽셀 (다각형 판정으로 다시 확인)
+
+# 점유 판정 규칙
+#   center  : 차량 박스 중심점이 슬롯 다각형 안
+#   iou     : 차량 박스와 슬롯 다각형의 IoU > 임계값
+#   overlap : 차량 박스 넓이 중 슬롯 안에 들어간 비율 >= 임계값
+OCCUPANCY_RULES = ("center", "iou", "overlap")
+DEFAULT_THRESHOLDS = {"center": None, "iou": 0.2, "overlap": 0.5}
+# 슬롯이 이 개수 이상이면 공간 인덱스로 후보만 검사 (모든 규칙)
+# 측정 (960x540, 차량 10~200대): 44 슬롯부터 인덱스가 같거나 빠르고 400 슬롯에서는 약 40배
+INDEX_MIN_SLOTS = 32
+
+
+# 슬롯 목록(load_slots 결과)을 (S, K, 2) 배열로 한 번만 변환
+def pack_slots(slots):
+    if len(slots) == 0:
+        return np.zeros((0, 4, 2), dtype=np.float64)
+    return np.asarray(slots, dtype=np.float64).reshape(len(slots), -1, 2)
+
+
+# YOLO 결과 -> (C, 4) 정수 박스 배열 (x1, y1, x2, y2)
+def boxes_from_results(results):
+    boxes = [r.boxes.xyxy.cpu().numpy() for r in results if len(r.boxes)]
+    if not boxes:
+        return np.zeros((0, 4), dtype=np.int32)
+    return np.concatenate(boxes).astype(np.int32)
+
+
+# 차량 박스 중심점 (기존 코드와 같이 정수 나눗셈)
+def box_centers(car_boxes):
+    boxes = np.asarray(car_boxes, dtype=np.int64).reshape(-1, 4)
+    cx = (boxes[:, 0] + boxes[:, 2]) // 2
+    cy = (boxes[:, 1] + boxes[:, 3]) // 2
+    return np.stack([cx, cy], axis=1)
+
+
+def _points_in_polygons(polys, points):
+    """(..., K, 2) 다각형, (..., 2) 점 (앞쪽 차원은 브로드캐스트) -> (...) bool
+    경계 위의 점도 포함 (pointPolygonTest >= 0 과 동일)"""
+    # 변(edge) 시작점 a, 끝점 b : (..., K)
+    ax = polys[..., 0]
+    ay = polys[..., 1]
+    rolled = np.roll(polys, -1, axis=-2)
+    bx = rolled[..., 0]
+    by = rolled[..., 1]
+    # 점 : (..., 1)
+    px = points[..., 0, None]
+    py = points[..., 1, None]
+
+    # 경계 위의 점 (외적 0 + 선분 범위 안)
+    cross = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    within = ((px >= np.minimum(ax, bx)) & (px <= np.maximum(ax, bx)) &
+              (py >= np.minimum(ay, by)) & (py <= np.maximum(ay, by)))
+    on_edge = ((cross == 0) & within).any(axis=-1)
+
+    # 반직선 교차 횟수 (홀수면 내부)
+    straddle = (ay > py) != (by > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = (bx - ax) * (py - ay) / (by - ay) + ax
+    crossings = (straddle & (px < x_cross)).sum(axis=-1)
+
+    return on_edge | (crossings % 2 == 1)
+
+
+def points_in_polygons(polys, points):
+    """(S, K, 2) 다각형 x (C, 2) 점 -> (S, C) 포함 행렬"""
+    polys = np.asarray(polys, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(polys) == 0 or len(points) == 0:
+        return np.zeros((len(polys), len(points)), dtype=bool)
+    return _points_in_polygons(polys[:, None], points[None, :])
+
+
+def polygon_areas(polys):
+    """(S, K, 2) 다각형 넓이 (신발끈 공식)"""
+    x = polys[..., 0]
+    y = polys[..., 1]
+    return 0.5 * np.abs((x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y).sum(axis=-1))
+
+
+def box_polygon_intersections(polys, boxes):
+    """짝지어진 (P, K, 2) 볼록 다각형과 (P, 4) 박스의 교차 넓이 -> (P,)"""
+    areas = np.zeros(len(polys), dtype=np.float64)
+    for i, (poly, (x1, y1, x2, y2)) in enumerate(zip(polys, boxes)):
+        rect = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+        areas[i], _ = cv2.intersectConvexConvex(poly.astype(np.float32), rect)
+    return areas
+
+
+def _expand_ranges(starts, counts):
+    """구간 [start, start+count) 들을 펼침 -> (소속 구간 인덱스, 값)"""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+class SlotGridIndex:
+    """슬롯 bbox를 균일 격자에 등록해 두고, 차량 박스 근처 슬롯만 후보로 돌려주는 공간 인덱스"""
+
+    def __init__(self, polys, cell_size=None):
+        self.n_slots = len(polys)
+        if self.n_slots == 0:
+            polys = np.zeros((0, 4, 2))
+        self.bboxes = np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1)
+
+        if cell_size is None:
+            # 슬롯 크기의 2배 정도면 셀당 후보가 몇 개로 유지된다
+            sizes = self.bboxes[:, 2:] - self.bboxes[:, :2]
+            cell_size = 2 * float(np.median(sizes.max(axis=1))) if self.n_slots else 1.0
+        self.cell_size = max(cell_size, 1.0)
+        self.origin = self.bboxes[:, :2].min(axis=0) if self.n_slots else np.zeros(2)
+
+        c0, c1 = self._cell_range(self.bboxes)
+        self.nx, self.ny = (c1.max(axis=0) + 1) if self.n_slots else (0, 0)
+
+        # (셀, 슬롯) 쌍을 셀 순서로 정렬한 CSR 구조
+        cells, slot_ids = self._expand_cells(c0, c1)
+        order = np.argsort(cells, kind="stable")
+        self.cell_slots = slot_ids[order]
+        counts = np.bincount(cells, minlength=self.nx * self.ny)
+        self.cell_start = np.concatenate([[0], np.cumsum(counts)])
+
+    def _cell_range(self, boxes):
+        c0 = np.floor((boxes[:, :2] - self.origin) / self.cell_size).astype(np.int64)
+        c1 = np.floor((boxes[:, 2:] - self.origin) / self.cell_size).astype(np.int64)
+        return c0, c1
+
+    def _expand_cells(self, c0, c1):
+        """박스마다 덮는 셀 목록 -> (박스 인덱스, 셀 ID)"""
+        c0 = np.maximum(c0, 0)
+        c1 = np.minimum(c1, [self.nx - 1, self.ny - 1])
+        w = np.maximum(c1[:, 0] - c0[:, 0] + 1, 0)
+        h = np.maximum(c1[:, 1] - c0[:, 1] + 1, 0)
+        owner, offset = _expand_ranges(np.zeros(len(w), dtype=np.int64), w * h)
+        cx = c0[owner, 0] + offset % np.maximum(w[owner], 1)
+        cy = c0[owner, 1] + offset // np.maximum(w[owner], 1)
+        return cy * self.nx + cx, owner
+
+    def candidates(self, boxes):
+        """(C, 4) 박스와 bbox가 겹치는 (박스 인덱스, 슬롯 인덱스) 쌍"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if self.n_slots == 0 or len(boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        c0, c1 = self._cell_range(boxes)
+        cells, box_idx = self._expand_cells(c0, c1)
+        starts = self.cell_start[cells]
+        pair_owner, pos = _expand_ranges(starts, self.cell_start[cells + 1] - starts)
+        box_idx = box_idx[pair_owner]
+        slot_idx = self.cell_slots[pos]
+
+        # 여러 셀에 걸친 중복 제거 후 bbox 교차로 한 번 더 거름
+        key = np.unique(box_idx * self.n_slots + slot_idx)
+        box_idx, slot_idx = key // self.n_slots, key % self.n_slots
+        b, s = boxes[box_idx], self.bboxes[slot_idx]
+        hit = ((b[:, 0] <= s[:, 2]) & (b[:, 2] >= s[:, 0]) &
+               (b[:, 1] <= s[:, 3]) & (b[:, 3] >= s[:, 1]))
+        return box_idx[hit], slot_idx[hit]
+
+
+def build_label_map(slots, frame_shape, mark_shared=False):
+    """슬롯 다각형을 (H, W) 라벨 이미지로 래스터화 (픽셀값 = 슬롯 ID, 0 = 슬롯 없음)
+    픽셀마다 다각형 판정(_points_in_polygons, pointPolygonTest >= 0 과 동일)을 해서 채우므로
+    fillPoly 와 달리 경계 근처 픽셀도 다각형 엔진과 같은 결과가 된다.
+    슬롯이 겹치는 픽셀은 뒤쪽 슬롯 ID가 남고, mark_shared 면 SHARED_LABEL 로 표시"""
+    h, w = frame_shape[:2]
+    labels = np.zeros((h, w), dtype=np.int32)
+    coverage = np.zeros((h, w), dtype=np.uint16) if mark_shared else None
+    for idx, pts in enumerate(slots):
+        poly = np.asarray(pts, dtype=np.float64)
+        # 슬롯 bbox 안의 픽셀만 판정
+        x1, y1 = np.maximum(np.floor(poly.min(axis=0)).astype(int), 0)
+        x2, y2 = np.minimum(np.ceil(poly.max(axis=0)).astype(int) + 1, (w, h))
+        if x1 >= x2 or y1 >= y2:
+            continue
+        ys, xs = np.mgrid[y1:y2, x1:x2]
+        inside = _points_in_polygons(poly, np.stack([xs, ys], axis=-1).astype(np.float64))
+        labels[y1:y2, x1:x2][inside] = idx + 1
+        if coverage is not None:
+            coverage[y1:y2, x1:x2] += inside
+    if coverage is not None:
+        labels[coverage > 1] = SHARED_LABEL
+    return labels
+
+
+def load_label_map(csv_path, slots, frame_shape, cache_dir=SLOT_CACHE_DIR):
+    """CSV 내용 + 해상도 기준으로 디스크에 캐시된 라벨 이미지를 읽고, 없으면 만들어 저장"""
+    h, w = frame_shape[:2]
+    with open(csv_path, "rb") as f:
+        key = hashlib.sha1(f.read()).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"labels_exact_{key}_{w}x{h}.npy")
+
+    if os.path.exists(cache_path):
+        try:
+            return np.load(cache_path)
+        except (OSError, ValueError):
+            print(f"라벨 캐시 손상, 다시 생성: {cache_path}")
+
+    labels = build_label_map(slots, frame_shape, mark_shared=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp.npy"
+    np.save(tmp_path, labels)
+    os.replace(tmp_path, cache_path)
+    return labels
+
+
+class SlotOccupancy:
+    """슬롯 다각형을 한 번 패킹해 두고, 프레임마다 슬롯 x 차량 점유를 한 번에 계산"""
+
+    def __init__(self, slots, csv_path=None, use_label_map=False,
+                 rule="center", threshold=None, use_index=None):
+        if rule not in OCCUPANCY_RULES:
+            raise ValueError(f"알 수 없는 점유 규칙: {rule} (가능: {', '.join(OCCUPANCY_RULES)})")
+        self.slots = slots
+        self.polys = pack_slots(slots)
+        self.csv_path = csv_path
+        self.use_label_map = use_label_map and rule == "center"
+        self.rule = rule
+        self.threshold = DEFAULT_THRESHOLDS[rule] if threshold is None else threshold
+        self._label_maps = {}
+
+        if use_index is None:
+            use_index = len(self.polys) >= INDEX_MIN_SLOTS
+        self.index = SlotGridIndex(self.polys) if use_index else None
+        self.areas = polygon_areas(self.polys)
+        self.bboxes = np.concatenate([self.polys.min(axis=1), self.polys.max(axis=1)], axis=1)
+
+    def __len__(self):
+        return len(self.polys)
+
+    def contains(self, car_boxes):
+        """(S, C) 행렬: 차량 중심점이 슬롯 안에 있으면 True"""
+        return points_in_polygons(self.polys, box_centers(car_boxes))
+
+    def match(self, car_boxes):
+        """점유 규칙을 만족하는 (슬롯 인덱스, 차량 인덱스) 쌍. 공간 인덱스가 있으면 근처 슬롯만 검사"""
+        boxes = np.asarray(car_boxes, dtype=np.float64).reshape(-1, 4)
+        if self.index is None:
+            if self.rule == "center":
+                slot_idx, car_idx = np.nonzero(self.contains(boxes))
+                return slot_idx, car_idx
+            # 인덱스 없이: bbox 가 겹치는 쌍만 규칙대로 정밀 판정
+            slot_idx, car_idx = self._bbox_pairs(np.arange(len(self.polys)), boxes)
+            hit = self._overlap_hits(slot_idx, car_idx, boxes)
+            return slot_idx[hit], car_idx[hit]
+
+        if self.rule == "center":
+            # 중심점이 들어갈 수 있는 슬롯은 중심점 셀에 등록된 슬롯뿐
+            centers = box_centers(boxes).astype(np.float64)
+            car_idx, slot_idx = self.index.candidates(np.concatenate([centers, centers], axis=1))
+            hit = _points_in_polygons(self.polys[slot_idx], centers[car_idx])
+            return slot_idx[hit], car_idx[hit]
+
+        car_idx, slot_idx = self.index.candidates(boxes)
+        hit = self._overlap_hits(slot_idx, car_idx, boxes)
+        return slot_idx[hit], car_idx[hit]
+
+    def _bbox_pairs(self, slot_idx, boxes):
+        """slot_idx 슬롯 bbox 와 차량 박스가 겹치는 쌍 -> (slot_idx 안의 위치, 차량 인덱스)"""
+        s = self.bboxes[slot_idx][:, None, :]
+        b = boxes[None, :, :]
+        near = ((b[..., 0] <= s[..., 2]) & (b[..., 2] >= s[..., 0]) &
+                (b[..., 1] <= s[..., 3]) & (b[..., 3] >= s[..., 1]))
+        return np.nonzero(near)
+
+    def _overlap_hits(self, slot_idx, car_idx, boxes):
+        """iou / overlap 규칙: (슬롯, 차량) 후보 쌍별 판정"""
+        inter = box_polygon_intersections(self.polys[slot_idx], boxes[car_idx])
+        b = boxes[car_idx]
+        car_area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        if self.rule == "iou":
+            score = inter / (car_area + self.areas[slot_idx] - inter + 1e-6)
+            return score > self.threshold
+        score = inter / (car_area + 1e-6)
+        return score >= self.threshold
+
+    def slots_in_rects(self, rects):
+        """bbox 가 (N, 4) 사각형 중 하나와 겹치는 슬롯 인덱스"""
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        b = self.bboxes[:, None, :]
+        r = rects[None, :, :]
+        hit = ((b[..., 0] <= r[..., 2]) & (b[..., 2] >= r[..., 0]) &
+               (b[..., 1] <= r[..., 3]) & (b[..., 3] >= r[..., 1]))
+        return np.nonzero(hit.any(axis=1))[0]
+
+    def subset_occupancy(self, slot_idx, car_boxes):
+        """일부 슬롯(slot_idx)만 다시 판정 -> (len(slot_idx),) bool"""
+        slot_idx = np.asarray(slot_idx, dtype=np.int64)
+        boxes = np.asarray(car_boxes, dtype=np.float64).reshape(-1, 4)
+        if len(slot_idx) == 0 or len(boxes) == 0:
+            return np.zeros(len(slot_idx), dtype=bool)
+        if self.rule == "center":
+            return points_in_polygons(self.polys[slot_idx], box_centers(boxes)).any(axis=1)
+
+        # bbox 가 겹치는 쌍만 정밀 판정
+        local_idx, car_idx = self._bbox_pairs(slot_idx, boxes)
+        hit = self._overlap_hits(slot_idx[local_idx], car_idx, boxes)
+        occupied = np.zeros(len(slot_idx), dtype=bool)
+        occupied[local_idx[hit]] = True
+        return occupied
+
+    def label_map(self, frame_shape):
+        """해상도별 라벨 이미지 (메모리 + 디스크 캐시)"""
+        key = tuple(frame_shape[:2])
+        if key not in self._label_maps:
+            if self.csv_path:
+                self._label_maps[key] = load_label_map(self.csv_path, self.slots, key)
+            else:
+                self._label_maps[key] = build_label_map(self.slots, key, mark_shared=True)
+        return self._label_maps[key]
+
+    def label_occupancy(self, car_boxes, frame_shape):
+        """중심점 픽셀의 라벨값으로 슬롯을 바로 찾음 (차량당 배열 인덱싱 1회)
+        슬롯 여러 개가 겹치는 픽셀의 중심점만 다각형 판정으로 다시 확인 (다각형 엔진과 같은 결과)"""
+        labels = self.label_map(frame_shape)
+        h, w = labels.shape
+        centers = box_centers(car_boxes)
+        inside = ((centers[:, 0] >= 0) & (centers[:, 0] < w) &
+                  (centers[:, 1] >= 0) & (centers[:, 1] < h))
+        centers = centers[inside]
+
+        found = labels[centers[:, 1], centers[:, 0]]
+        shared = found == SHARED_LABEL
+        hit = np.zeros(len(self.polys) + 1, dtype=bool)
+        hit[found[~shared]] = True
+        occupied = hit[1:]
+        if shared.any():
+            occupied |= points_in_polygons(self.polys, centers[shared]).any(axis=1)
+        return occupied
+
+    def occupancy(self, car_boxes, frame_shape=None):
+        """(S,) bool 배열: 슬롯별 점유 여부"""
+        if self.use_label_map and frame_shape is not None:
+            return self.label_occupancy(car_boxes, frame_shape)
+        if self.index is None and self.rule == "center":
+            return self.contains(car_boxes).any(axis=1)
+        occupied = np.zeros(len(self.polys), dtype=bool)
+        occupied[self.match(car_boxes)[0]] = True
+        return occupied
@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+
+OCCUPIED_COLOR = (0, 0, 255)
+EMPTY_COLOR = (0, 255, 0)
+LINE_THICKNESS = 2
+FONT_SCALE = 0.6
+# 안티에일리어싱된 글자 가장자리(OpenCV 5 의 putText)는 이 값 이상만 칠함 (매 프레임 섞지 않음)
+SOLID_COVERAGE = 128
+
+
+class SlotOverlay:
+    """슬롯 외곽선 + 번호를 미리 그려 둔 레이어 (해상도 하나당 한 번 생성)
+    매 프레임 polylines / putText 를 다시 하지 않고 마스크로 프레임에 덮어쓴다.
+    슬롯마다 자기 픽셀 목록을 들고 있어서 점유 상태가 바뀐 슬롯만 레이어에서 색을 바꾼다.
+    (겹치는 픽셀은 나중 번호 슬롯 소유 -> 슬롯을 순서대로 전부 그린 결과와 같음,
+    단 글자 가장자리의 반투명 픽셀은 SOLID_COVERAGE 기준으로 칠하거나 버림)"""
+
+    def __init__(self, slots, frame_shape, thickness=LINE_THICKNESS, font_scale=FONT_SCALE):
+        h, w = frame_shape[:2]
+        self.shape = (h, w)
+        owner = np.full(h * w, -1, dtype=np.int32)
+
+        for idx, pts in enumerate(slots):
+            pts_np = np.array(pts, dtype=np.int32)
+            label = str(idx + 1)
+            (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            tx, ty = pts[0]
+            # 외곽선 + 번호가 그려질 수 있는 영역만 작은 패치로 그림
+            x1 = max(min(pts_np[:, 0].min(), tx) - thickness - 1, 0)
+            y1 = max(min(pts_np[:, 1].min(), ty - th) - thickness - 1, 0)
+            x2 = min(max(pts_np[:, 0].max(), tx + tw) + thickness + 2, w)
+            y2 = min(max(pts_np[:, 1].max(), ty + baseline) + thickness + 2, h)
+            if x1 >= x2 or y1 >= y2:
+                continue
+            patch = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            offset = np.array([x1, y1], dtype=np.int32)
+            cv2.polylines(patch, [pts_np - offset], True, 255, thickness)
+            cv2.putText(patch, label, (tx - x1, ty - y1), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, thickness)
+            ys, xs = np.nonzero(patch >= SOLID_COVERAGE)
+            owner[(ys + y1) * w + (xs + x1)] = idx
+
+        # 슬롯 번호 순으로 정렬한 픽셀 목록 (CSR): 슬롯 idx 의 픽셀 = pixels[starts[idx]:starts[idx+1]]
+        drawn = np.nonzero(owner >= 0)[0]
+        order = np.argsort(owner[drawn], kind="stable")
+        self.pixels = drawn[order]
+        self.starts = np.searchsorted(owner[self.pixels], np.arange(len(slots) + 1))
+
+        self.mask = (owner >= 0).astype(np.uint8).reshape(h, w)
+        self.layer = np.zeros((h, w, 3), dtype=np.uint8)
+        self.state = np.zeros(len(slots), dtype=bool)
+        self._paint(np.arange(len(slots)), self.state)
+
+    def _paint(self, slot_idx, occupied):
+        flat = self.layer.reshape(-1, 3)
+        for idx in slot_idx:
+            color = OCCUPIED_COLOR if occupied[idx] else EMPTY_COLOR
+            flat[self.pixels[self.starts[idx]:self.starts[idx + 1]]] = color
+
+    def render(self, frame, occupied):
+        """바뀐 슬롯만 레이어에 다시 칠하고 프레임에 합성 (frame 을 직접 수정)"""
+        occupied = np.asarray(occupied, dtype=bool)
+        changed = np.nonzero(occupied != self.state)[0]
+        if len(changed):
+            self.state[changed] = occupied[changed]
+            self._paint(changed, self.state)
+        cv2.copyTo(self.layer, self.mask, frame)
+        return frame
@@ -0,0 +1,228 @@
+import time
+import threading
+from collections import deque
+from inference import BATCH_SIZE, ThroughputMeter
+from occupancy import boxes_from_results
+from detectors import LazyDetector
+
+BATCH_WAIT_SEC = 0.02  # 첫 요청 후 다른 카메라 요청을 모으려고 기다리는 최대 시간
+RATE_WINDOW_SEC = 10.0 # 카메라별 분석 속도(Hz)를 계산하는 구간
+
+
+class _Request:
+    __slots__ = ("cam_id", "frame", "key", "counted", "submitted", "done", "result", "error")
+
+    def __init__(self, cam_id, frame, key, counted=True):
+        self.cam_id = cam_id
+        self.frame = frame
+        self.key = key          # (imgsz, conf): 같은 값끼리만 한 배치로 추론
+        self.counted = counted  # 카메라 감지 횟수에 셀지 (타일 / ROI 는 호출당 한 번만)
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceScheduler:
+    """여러 카메라(주차장)가 YOLO 모델 하나를 같이 쓰도록 감지 요청을 모아서 배치 추론
+    모델은 스케줄러 스레드에서만 호출되고, 각 카메라 세션은 detect() 에서 결과를 기다린다.
+    요청이 batch_size 보다 많으면 priority x 대기 시간이 큰 카메라부터 뽑는다
+    (우선순위가 같으면 오래 기다린 순서 = 라운드 로빈).
+    타일 / ROI 처럼 입력 크기가 다른 요청은 predict_many() 나 model_for() 로 보내고,
+    입력 크기와 conf 가 같은 요청끼리만 배치로 묶는다.
+    model 이 LazyDetector 면 첫 배치를 추론할 때 로드한다."""
+
+    def __init__(self, model, imgsz=640, conf=0.25, batch_size=BATCH_SIZE,
+                 batch_wait=BATCH_WAIT_SEC, window=RATE_WINDOW_SEC):
+        self.model = model
+        self.imgsz = imgsz
+        self.conf = conf
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.window = window
+
+        self.cond = threading.Condition()
+        self.pending = []
+        self.cameras = {}
+        self.meter = ThroughputMeter(batch_size)
+        self.started_at = time.perf_counter()
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add_camera(self, cam_id, priority=1.0):
+        with self.cond:
+            self.cameras[cam_id] = {
+                "priority": float(priority),
+                "frames": 0,            # 세션이 처리한 프레임 (감지 생략 포함)
+                "detections": 0,        # 실제로 YOLO 를 돌린 프레임
+                "latency_sec": 0.0,     # 요청부터 결과까지 누적 (대기 + 추론)
+                "recent": deque(),      # 최근 감지 시각 (분석 속도 계산용)
+                "recent_frames": deque(),
+            }
+
+    def remove_camera(self, cam_id):
+        with self.cond:
+            self.cameras.pop(cam_id, None)
+
+    def count_frame(self, cam_id):
+        """세션이 프레임 하나를 처리했다고 기록 (감지 여부와 무관)"""
+        with self.cond:
+            cam = self.cameras.get(cam_id)
+            if cam is not None:
+                cam["frames"] += 1
+                self._push(cam["recent_frames"], time.perf_counter())
+
+    def _push(self, stamps, now):
+        """최근 시각 목록에 추가하면서 window 보다 오래된 것은 버림 (카메라별 메모리 고정)"""
+        stamps.append(now)
+        while now - stamps[0] > self.window:
+            stamps.popleft()
+
+    def predict_many(self, cam_id, images, imgsz=None, conf=None, timeout=None):
+        """이미지 여러 장(타일 / 잘라낸 영역 등) 감지 요청 -> 이미지별 ultralytics 형식 결과 목록
+        모델은 스케줄러 스레드에서만 호출되고, 카메라 감지 횟수는 호출당 한 번으로 센다"""
+        key = (imgsz or self.imgsz, self.conf if conf is None else conf)
+        requests = [_Request(cam_id, image, key, counted=i == 0) for i, image in enumerate(images)]
+        if not requests:
+            return []
+        with self.cond:
+            if self.stopped:
+                raise RuntimeError("스케줄러가 종료되었습니다.")
+            self.pending.extend(requests)
+            self.cond.notify_all()
+        for request in requests:
+            if not request.done.wait(timeout):
+                raise TimeoutError(f"카메라 {cam_id} 감지 요청 시간 초과")
+            if request.error is not None:
+                raise request.error
+        return [request.result for request in requests]
+
+    def detect(self, cam_id, frame, timeout=None):
+        """프레임 한 장 감지 요청 -> (C, 4) 차량 박스 배열 (다른 카메라 요청과 같은 배치로 추론됨)"""
+        return boxes_from_results(self.predict_many(cam_id, [frame], timeout=timeout))
+
+    def model_for(self, cam_id):
+        """predict() 를 이 스케줄러로 보내는 모델 대용 객체 (predict_tiled / RoiDetector 에 그대로 넘김)"""
+        return _ScheduledModel(self, cam_id)
+
+    def _pick(self):
+        """이번 배치로 보낼 요청 선택 (lock 안에서 호출)"""
+        key = self.pending[0].key
+        if len(self.pending) <= self.batch_size and all(req.key == key for req in self.pending):
+            batch, self.pending = self.pending, []
+            return batch
+
+        now = time.perf_counter()
+
+        def score(req):
+            cam = self.cameras.get(req.cam_id)
+            priority = cam["priority"] if cam is not None else 1.0
+            return priority * (now - req.submitted)
+
+        ranked = sorted(self.pending, key=score, reverse=True)
+        # 가장 급한 요청과 입력 크기 / conf 가 같은 요청만 (나머지는 다음 배치)
+        key = ranked[0].key
+        batch = [req for req in ranked if req.key == key][:self.batch_size]
+        chosen = set(map(id, batch))
+        self.pending = [req for req in ranked if id(req) not in chosen]
+        return batch
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.stopped)
+                if self.stopped:
+                    break
+                # 다른 카메라 요청이 들어올 시간을 잠깐 줌 (배치가 차면 바로 추론)
+                deadline = time.perf_counter() + self.batch_wait
+                while len(self.pending) < self.batch_size and not self.stopped:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                batch = self._pick()
+
+            t0 = time.perf_counter()
+            try:
+                model = self.model.get() if isinstance(self.model, LazyDetector) else self.model
+                imgsz, conf = batch[0].key
+                results = model.predict([req.frame for req in batch], imgsz=imgsz, conf=conf,
+                                        classes=[0], verbose=False)
+            except Exception as e:
+                print(f"배치 추론 실패: {e}")
+                results = None
+                for req in batch:
+                    req.error = e
+            t1 = time.perf_counter()
+            self.meter.add(len(batch), t1 - t0)
+
+            with self.cond:
+                for i, req in enumerate(batch):
+                    if results is not None:
+                        req.result = results[i]
+                    cam = self.cameras.get(req.cam_id)
+                    if cam is not None and req.counted:
+                        cam["detections"] += 1
+                        cam["latency_sec"] += t1 - req.submitted
+                        self._push(cam["recent"], t1)
+            for req in batch:
+                req.frame = None
+                req.done.set()
+
+        # 종료: 남은 요청은 오류로 깨움
+        with self.cond:
+            leftover, self.pending = self.pending, []
+        for req in leftover:
+            req.error = RuntimeError("스케줄러가 종료되었습니다.")
+            req.done.set()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join(timeout=5.0)
+
+    def _rate(self, stamps, now):
+        while stamps and now - stamps[0] > self.window:
+            stamps.popleft()
+        span = min(self.window, now - self.started_at)
+        return len(stamps) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        """카메라별 실제 분석 속도 + 모델 사용률 (사용률이 1 에 가까우면 이 장비의 카메라 수 한계)"""
+        now = time.perf_counter()
+        with self.cond:
+            cameras = {}
+            for cam_id, cam in self.cameras.items():
+                cameras[cam_id] = {
+                    "priority": cam["priority"],
+                    "frames": cam["frames"],
+                    "detections": cam["detections"],
+                    "frame_rate": round(self._rate(cam["recent_frames"], now), 2),
+                    "detect_rate": round(self._rate(cam["recent"], now), 2),
+                    "avg_latency_ms": round(cam["latency_sec"] * 1000 / cam["detections"], 1)
+                    if cam["detections"] else 0.0,
+                }
+            pending = len(self.pending)
+        elapsed = max(now - self.started_at, 1e-6)
+        summary = self.meter.summary()
+        return {
+            "cameras": cameras,
+            "pending": pending,
+            "avg_batch": round(summary["frames"] / summary["batches"], 2) if summary["batches"] else 0.0,
+            "utilization": round(min(summary["inference_sec"] / elapsed, 1.0), 3),
+            **summary,
+        }
+
+
+class _ScheduledModel:
+    """ultralytics YOLO.predict 와 같은 호출 방식으로 스케줄러에 감지를 요청"""
+
+    def __init__(self, scheduler, cam_id):
+        self.scheduler = scheduler
+        self.cam_id = cam_id
+
+    def predict(self, source, imgsz=None, conf=None, classes=None, verbose=False, **kwargs):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        return self.scheduler.predict_many(self.cam_id, images, imgsz, conf)
@@ -0,0 +1,190 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from occupancy import SlotOccupancy
+from inference import BATCH_SIZE, TILE_SIZE, layout_tiles, predict_boxes, predict_tiled, read_batches, read_gated_batches
+from motion import MotionGate
+from tracker import OccupancyTracker
+from sources import FrameSampler, sample_step
+
+SEGMENT_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # 구간 분석 프로세스 수 (프로세스당 모델 1개)
+MIN_SEGMENT_FRAMES = 300                              # 이보다 짧게는 나누지 않음
+
+_worker_model = None
+
+
+def split_segments(total_frames, n_segments, step=1, min_frames=MIN_SEGMENT_FRAMES):
+    """[0, total_frames) 를 n_segments 개 (start, end) 구간으로 나눔
+    경계는 step 의 배수로 맞춰서 구간별로 샘플링해도 전체를 한 번에 샘플링한 것과 같은 프레임을 고름"""
+    n_segments = max(1, min(n_segments, total_frames // max(min_frames, 1)))
+    bounds = np.linspace(0, total_frames, n_segments + 1)
+    bounds = (np.round(bounds / step) * step).astype(int)
+    bounds[-1] = total_frames
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _init_worker(threads):
+    # 프로세스끼리 코어를 나눠 쓰도록 스레드 수 제한
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _analyze_segment(video_path, start, end, step, batch_size, motion_gate, tiled):
+    """작업 프로세스: 한 구간의 감지 결과만 모아서 돌려줌 (상태 머신은 메인 프로세스에서 순서대로 재생)
+    -> 감지한 프레임 번호 / 슬롯 점유(비트 압축) / 차량 수 + 구간 통계"""
+    global _worker_model
+    import ai_module
+    from detectors import load_detector
+
+    t_start = time.perf_counter()
+    slots = ai_module.load_slots(ai_module.CSV_PATH)
+    slot_engine = SlotOccupancy(slots, rule=ai_module.OCCUPANCY_RULE, threshold=ai_module.OCCUPANCY_THRESHOLD)
+    if _worker_model is None:
+        _worker_model = load_detector(path=ai_module.MODEL_PATH)
+    model = _worker_model
+
+    cap = cv2.VideoCapture(video_path)
+    sampler = FrameSampler(cap, step, start=start, end=end)
+    tiles = None
+    if tiled:
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+        tiles = layout_tiles(slot_engine.bboxes, frame_shape)
+
+    # 구간 첫 프레임은 움직임 게이트가 항상 감지하므로 경계에서 이전 구간 결과가 필요 없음
+    gate = MotionGate(slots) if motion_gate else None
+    if gate is not None:
+        batches = read_gated_batches(sampler, gate, batch_size)
+    else:
+        batches = (list(zip(indices, frames)) for indices, frames in read_batches(sampler, batch_size))
+
+    indices, observed, car_counts = [], [], []
+    total_car_count = 0
+    sampled = 0
+    last_count = 0
+    infer_sec = 0.0
+    for batch in batches:
+        frames = [frame for _, frame in batch if frame is not None]
+        t0 = time.perf_counter()
+        if tiles is not None:
+            boxes_per_frame = iter(predict_tiled(model, frames, tiles, TILE_SIZE, ai_module.CONFIDENCE))
+        else:
+            boxes_per_frame = iter(predict_boxes(model, frames, ai_module.IMGSZ, ai_module.CONFIDENCE))
+        infer_sec += time.perf_counter() - t0
+
+        for frame_index, frame in batch:
+            sampled += 1
+            if frame is not None:
+                car_boxes = next(boxes_per_frame)
+                indices.append(frame_index)
+                observed.append(slot_engine.occupancy(car_boxes))
+                last_count = len(car_boxes)
+                car_counts.append(last_count)
+            total_car_count += last_count
+    cap.release()
+
+    observed = np.array(observed, dtype=bool).reshape(len(indices), len(slots))
+    return {
+        "start": start,
+        "end": end,
+        "indices": np.array(indices, dtype=np.int64),
+        "observed": np.packbits(observed, axis=1),
+        "car_counts": np.array(car_counts, dtype=np.int32),
+        "total_car_count": total_car_count,
+        "sampled": sampled,
+        "detections": len(indices),
+        "inference_sec": round(infer_sec, 3),
+        "wall_sec": round(time.perf_counter() - t_start, 3),
+    }
+
+
+def analyze_parking_video_parallel(video_path, workers=SEGMENT_WORKERS, segments=None,
+                                   batch_size=BATCH_SIZE, motion_gate=True, tiled=False,
+                                   sample_every_sec=None):
+    """긴 영상을 시간 구간으로 나눠 프로세스별로 분석하고, 구간 결과를 순서대로 합쳐
+    analyze_parking_video 와 같은 형식의 결과를 돌려줌
+    (슬롯 상태 머신은 모든 감지 결과를 순서대로 한 번에 재생하므로 구간 경계에서도 끊기지 않음)"""
+    import ai_module
+
+    t_start = time.perf_counter()
+    slots = ai_module.load_slots(ai_module.CSV_PATH)
+    cap = cv2.VideoCapture(video_path)
+    if not slots or not cap.isOpened():
+        print("영상 또는 슬롯 정보를 읽을 수 없습니다.")
+        return {}
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    step = sample_step(fps, sample_every_sec)
+    bounds = split_segments(total_frames, segments or workers, step)
+    workers = max(1, min(workers, len(bounds)))
+    print(f"구간 분석 시작: {video_path} ({len(bounds)}개 구간, {workers}개 프로세스)")
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads,)) as executor:
+        futures = [executor.submit(_analyze_segment, video_path, start, end, step,
+                                   batch_size, motion_gate, tiled)
+                   for start, end in bounds]
+        parts = [future.result() for future in futures]
+
+    # 구간 순서대로 감지 결과를 재생
+    tracker = OccupancyTracker(len(slots))
+    for part in parts:
+        observed = np.unpackbits(part["observed"], axis=1, count=len(slots)).astype(bool)
+        for frame_index, row in zip(part["indices"].tolist(), observed):
+            tracker.update(row, frame_index / fps)
+
+    # 구간별 감지 시점의 차량 수를 이어 붙인 전체 타임라인 (프레임 번호, 초, 차량 수)
+    timeline_frames = np.concatenate([np.zeros(0, dtype=np.int64)] + [part["indices"] for part in parts])
+    timeline_cars = np.concatenate([np.zeros(0, dtype=np.int32)] + [part["car_counts"] for part in parts])
+
+    sampled = sum(part["sampled"] for part in parts)
+    total_car_count = sum(part["total_car_count"] for part in parts)
+    frame_count = max((part["end"] for part in parts), default=0)
+    wall_sec = time.perf_counter() - t_start
+
+    return {
+        "spaces": {idx + 1: bool(o) for idx, o in enumerate(tracker.state)},
+        "vehicles": {"car": int(total_car_count / sampled) if sampled else 0},
+        "slots": {idx + 1: slot for idx, slot in enumerate(slots)},
+        "slot_stats": tracker.slot_stats(frame_count / fps),
+        "turnovers": int(tracker.turnovers.sum()),
+        "stats": {
+            "workers": workers,
+            "segments": [{k: part[k] for k in ("start", "end", "sampled", "detections",
+                                                "inference_sec", "wall_sec")} for part in parts],
+            "sample_step": step,
+            "sampled_frames": sampled,
+            "detections": sum(part["detections"] for part in parts),
+            "car_timeline": {
+                "frame": timeline_frames.tolist(),
+                "sec": np.round(timeline_frames / fps, 2).tolist(),
+                "cars": timeline_cars.tolist(),
+            },
+            "wall_sec": round(wall_sec, 3),
+        },
+    }
+
+
+# 프로세스 수별 벽시계 시간 / 속도 향상 비교: python segments.py [영상 경로] [프로세스 수 ...]
+if __name__ == "__main__":
+    import sys
+    video = sys.argv[1] if len(sys.argv) > 1 else "../videos/test02.mp4"
+    counts = [int(n) for n in sys.argv[2:]] or sorted({1, 2, 4, SEGMENT_WORKERS})
+
+    base = None
+    for n in counts:
+        result = analyze_parking_video_parallel(video, workers=n)
+        wall = result["stats"]["wall_sec"]
+        base = base or wall
+        print(f"workers={n:>2}  {wall:>8.2f} s  speedup x{base / wall:.2f}  "
+              f"turnovers={result['turnovers']}")
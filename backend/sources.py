@@ -0,0 +1,329 @@
+import os
+import time
+import threading
+import cv2
+
+UPLOADING_SUFFIX = ".uploading"  # 업로드 중인 파일 옆에 생기는 표시 파일
+GROW_POLL_SEC = 0.5              # 파일이 더 쌓이길 기다리는 간격
+GROW_IDLE_TIMEOUT = 600          # 이 시간 동안 파일이 안 늘어나면 업로드가 끊긴 것으로 봄
+SEEK_MIN_STEP = 48               # 이보다 많이 건너뛸 때만 seek 시도 (보통 키프레임 간격 이상)
+
+
+def uploading_marker(path):
+    return path + UPLOADING_SUFFIX
+
+
+def is_uploading(path):
+    return os.path.exists(uploading_marker(path))
+
+
+class GrowingVideoCapture:
+    """아직 업로드 중인 영상을 앞부분부터 읽는 VideoCapture 대용
+    끝에 도달했는데 업로드가 안 끝났으면 파일이 늘어날 때까지 기다렸다가 다시 열고 이어서 읽는다.
+    (moov 가 앞에 있는 faststart mp4 / mkv 등 앞부분만으로 디코딩 가능한 형식에서만 의미가 있음)"""
+
+    def __init__(self, path, poll=GROW_POLL_SEC, idle_timeout=GROW_IDLE_TIMEOUT):
+        self.path = path
+        self.poll = poll
+        self.idle_timeout = idle_timeout
+        self.position = 0
+        self.cap = None
+        self._reopen()
+
+    def _wait_for_growth(self):
+        """파일이 커지면 True, 업로드가 끝났거나 멈췄으면 False"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        idle_since = time.time()
+        while is_uploading(self.path):
+            time.sleep(self.poll)
+            new_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if new_size > size:
+                return True
+            if time.time() - idle_since > self.idle_timeout:
+                return False
+        return True  # 업로드 완료 -> 마지막으로 한 번 더 열어 봄
+
+    def _reopen(self):
+        while True:
+            if self.cap is not None:
+                self.cap.release()
+            self.cap = cv2.VideoCapture(self.path)
+            if self.cap.isOpened():
+                if self.position:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.position)
+                return True
+            if not is_uploading(self.path) or not self._wait_for_growth():
+                return False
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        while True:
+            ret, frame = self.cap.read()
+            if ret:
+                self.position += 1
+                return ret, frame
+            if not is_uploading(self.path):
+                return False, None
+            if not self._wait_for_growth() or not self._reopen():
+                return False, None
+
+    def grab(self):
+        while True:
+            if self.cap.grab():
+                self.position += 1
+                return True
+            if not is_uploading(self.path):
+                return False
+            if not self._wait_for_growth() or not self._reopen():
+                return False
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+def open_video(path):
+    """업로드 중이면 GrowingVideoCapture, 아니면 일반 VideoCapture"""
+    if is_uploading(path):
+        return GrowingVideoCapture(path)
+    return cv2.VideoCapture(path)
+
+
+def sample_step(fps, seconds):
+    """seconds 초마다 한 장 -> 프레임 간격 (None / 0 이면 1 = 매 프레임)"""
+    return max(1, round(fps * seconds)) if seconds else 1
+
+
+class FrameSampler:
+    """파일 영상에서 step 프레임마다 한 장씩 읽음 (배속 재생 / 긴 녹화본 듬성듬성 분석)
+    건너뛰는 프레임은 grab() 만 호출해서 색 변환 / 복사를 생략하고, 간격이 SEEK_MIN_STEP 이상이면
+    CAP_PROP_POS_FRAMES 로 seek 한다. seek 은 앞쪽 키프레임부터 다시 디코딩하므로 키프레임 간격이
+    길면 오히려 느릴 수 있어서, 실제로 걸린 시간을 grab 과 비교해 느리면 grab 으로 돌아간다.
+    read() -> (ret, frame), 방금 읽은 프레임 번호(1부터)는 index
+    start / end: 프레임 번호 start 다음부터 end 까지만 읽음 (구간 분석용)"""
+
+    def __init__(self, cap, step=1, seek_min_step=SEEK_MIN_STEP, start=0, end=None):
+        self.cap = cap
+        self.step = max(1, int(step))
+        self.seek_min_step = seek_min_step
+        self.end = end
+        # 업로드 중인 파일(GrowingVideoCapture) 등은 seek 하지 않음
+        self.can_seek = isinstance(cap, cv2.VideoCapture)
+        self.index = 0
+        self.grab_sec = None  # grab 한 번 평균 시간 (지수 이동 평균)
+        self.seek_sec = None
+        self.stats = {"read": 0, "grabbed": 0, "seeks": 0}
+        if start > 0:
+            if self.can_seek and cap.set(cv2.CAP_PROP_POS_FRAMES, start):
+                self.index = start
+                self.stats["seeks"] += 1
+            else:
+                self._skip(start)
+
+    @classmethod
+    def every_seconds(cls, cap, seconds, **kwargs):
+        """시간 간격으로 샘플링 (예: 5초마다 한 장), seconds 가 None 이면 매 프레임"""
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return cls(cap, step=sample_step(fps, seconds), **kwargs)
+
+    def _average(self, prev, value):
+        return value if prev is None else prev * 0.9 + value * 0.1
+
+    def _skip(self, n):
+        """n 프레임 건너뜀 -> 성공 여부"""
+        if n <= 0:
+            return True
+        # 처음엔 grab 으로 건너뛰며 시간을 재고, 그 다음 seek 을 한 번 시도해 본 뒤 빠른 쪽을 사용
+        use_seek = (self.can_seek and n >= self.seek_min_step and self.grab_sec is not None and
+                    (self.seek_sec is None or self.seek_sec < self.grab_sec * n))
+        if use_seek:
+            t0 = time.perf_counter()
+            target = self.index + n
+            if self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                self.seek_sec = self._average(self.seek_sec, time.perf_counter() - t0)
+                self.index = target
+                self.stats["seeks"] += 1
+                return True
+            self.can_seek = False  # seek 을 지원하지 않는 백엔드
+
+        for _ in range(n):
+            t0 = time.perf_counter()
+            if not self.cap.grab():
+                return False
+            self.grab_sec = self._average(self.grab_sec, time.perf_counter() - t0)
+            self.index += 1
+            self.stats["grabbed"] += 1
+        return True
+
+    def read(self):
+        # 첫 프레임은 step 번째 프레임 (기존 "frame_count % step == 0" 과 같은 프레임 선택)
+        if self.end is not None and self.index + self.step > self.end:
+            return False, None
+        if not self._skip(self.step - 1):
+            return False, None
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        self.index += 1
+        self.stats["read"] += 1
+        return True, frame
+
+    def __iter__(self):
+        """(프레임 번호, 프레임) 을 끝까지"""
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                break
+            yield self.index, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+RECONNECT_DELAY = 1.0      # 재연결 대기 (실패할수록 2배씩, 최대 RECONNECT_MAX_DELAY)
+RECONNECT_MAX_DELAY = 30.0
+
+
+def parse_source(source):
+    """"0" 같은 숫자는 장치 번호, 나머지(rtsp://, http://, 파일 경로)는 그대로"""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class LatestFrameReader:
+    """실시간 영상(RTSP/HTTP/장치)을 전용 스레드에서 계속 읽고 가장 최근 프레임 하나만 보관
+    추론이 느려도 밀린 프레임이 쌓이지 않으므로 지연이 늘지 않는다 (못 가져간 프레임은 dropped 로 집계).
+    연결이 끊기면 자동으로 다시 연결한다.
+    replay=True 면 로컬 파일을 원본 FPS 속도로 반복 재생해서 실시간 소스처럼 흉내낸다 (테스트용)"""
+
+    def __init__(self, source, replay=False, reconnect_delay=RECONNECT_DELAY,
+                 max_delay=RECONNECT_MAX_DELAY):
+        self.source = parse_source(source)
+        self.replay = replay
+        self.reconnect_delay = reconnect_delay
+        self.max_delay = max_delay
+
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.last_read_seq = 0
+        self.stopped = False
+        self.connected = False
+        self.fps = 0.0
+        self.stats = {"received": 0, "returned": 0, "dropped": 0, "reconnects": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if cap.isOpened():
+            # 장치/스트림 내부 버퍼도 최소로 (지원하는 백엔드만 적용됨)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return cap
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self.stopped:
+            cap = self._open()
+            if not cap.isOpened():
+                cap.release()
+                print(f"영상 소스 연결 실패, {delay:.0f}초 후 재시도: {self.source}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+                self.stats["reconnects"] += 1
+                continue
+
+            self.connected = True
+            delay = self.reconnect_delay
+            interval = 1.0 / self.fps
+            next_time = time.perf_counter()
+            while not self.stopped:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.replay:
+                    # 파일을 원본 FPS 로 재생
+                    wait = next_time - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    next_time = max(next_time + interval, time.perf_counter() - interval)
+                with self.cond:
+                    if self.seq > self.last_read_seq:
+                        self.stats["dropped"] += 1
+                    self.frame = frame
+                    self.seq += 1
+                    self.stats["received"] += 1
+                    self.cond.notify_all()
+            cap.release()
+            self.connected = False
+
+            if not self.stopped and not self.replay:
+                print(f"영상 소스 끊김, 다시 연결합니다: {self.source}")
+                self.stats["reconnects"] += 1
+                time.sleep(delay)
+
+    def read(self, timeout=1.0):
+        """이전에 돌려준 것보다 새로운 프레임이 올 때까지 기다림 -> (ret, frame)
+        timeout 안에 새 프레임이 없으면 (False, None)"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > self.last_read_seq or self.stopped, timeout):
+                return False, None
+            if self.stopped:
+                return False, None
+            self.last_read_seq = self.seq
+            self.stats["returned"] += 1
+            return True, self.frame
+
+    def isOpened(self):
+        return not self.stopped
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if self.frame is not None and prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.frame.shape[0]
+        if self.frame is not None and prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.frame.shape[1]
+        return 0
+
+    def release(self):
+        # 세션이 끝나도 카메라 연결은 유지 (stop() 으로만 종료)
+        pass
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join(timeout=2.0)
+
+    def snapshot(self):
+        return {"source": str(self.source), "connected": self.connected,
+                "fps": round(self.fps, 2), **self.stats}
+
+
+# 실시간 소스 흉내 확인: python sources.py [영상 경로] [초]
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "../videos/test02.mp4"
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    reader = LatestFrameReader(path, replay=True)
+    t0 = time.time()
+    while time.time() - t0 < seconds:
+        ret, frame = reader.read()
+        time.sleep(0.1)  # 느린 추론 흉내 -> 밀리지 않고 최신 프레임만 받음
+    reader.stop()
+    print(reader.snapshot())
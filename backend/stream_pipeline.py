@@ -0,0 +1,478 @@
+import asyncio
+import base64
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from sources import FrameSampler, open_video
+
+QUEUE_SIZE = 4
+KEEPALIVE_SEC = 15.0  # 변화가 없을 때 연결 유지용 빈 메시지 간격
+_END = object()  # 스트림 종료 표시
+
+
+class FramePipeline:
+    """디코더 -> 추론 -> 인코더 단계를 각자 스레드로 돌리고 크기 제한 큐로 연결
+    전체 처리량은 단계 합이 아니라 가장 느린 단계에 맞춰진다.
+
+    source: 영상 파일 경로 또는 capture 객체(read/release)를 돌려주는 함수 (실시간 소스)
+    process_fn(frame, frame_index) -> 화면에 그릴 프레임
+    encode_fn(frame) -> 전송할 bytes
+    drop_*: 큐가 가득 찼을 때 가장 오래된 항목을 버릴지(True) 기다릴지(False)
+            drop_decoded 를 생략하면 실시간 소스만 버림 (밀린 카메라 프레임이 쌓이지 않게)
+    """
+
+    def __init__(self, source, process_fn, encode_fn, skip_frames=1,
+                 queue_size=QUEUE_SIZE, drop_decoded=None, drop_encoded=True, live=False):
+        self.source = source
+        self.live = live
+        self.process_fn = process_fn
+        self.encode_fn = encode_fn
+        self.skip_frames = max(1, skip_frames)
+        self.sampler = None
+
+        self.decoded_q = queue.Queue(maxsize=queue_size)
+        self.processed_q = queue.Queue(maxsize=queue_size)
+        self.encoded_q = queue.Queue(maxsize=queue_size)
+        self.drop_decoded = live if drop_decoded is None else drop_decoded
+        self.drop_encoded = drop_encoded
+
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.error = None  # 예외로 멈춘 단계와 메시지
+        self.stats = {
+            "decoded": 0,
+            "processed": 0,
+            "encoded": 0,
+            "sent": 0,
+            "dropped": {"decoded": 0, "processed": 0, "encoded": 0},
+            "stage_ms": {"decode": 0.0, "process": 0.0, "encode": 0.0},
+        }
+
+    # ---------------------------------------------
+    # 큐 유틸
+    def _put(self, q, item, drop, name):
+        """drop=True 면 가득 찼을 때 가장 오래된 프레임을 버리고 개수를 센다"""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if drop and item is not _END:
+                    try:
+                        q.get_nowait()
+                        with self.lock:
+                            self.stats["dropped"][name] += 1
+                    except queue.Empty:
+                        pass
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _count(self, key, stage, elapsed):
+        with self.lock:
+            self.stats[key] += 1
+            # 단계별 처리 시간 (지수 이동 평균, ms)
+            prev = self.stats["stage_ms"][stage]
+            self.stats["stage_ms"][stage] = elapsed * 1000 if prev == 0 else prev * 0.9 + elapsed * 100
+
+    # ---------------------------------------------
+    # 단계별 스레드
+    def _fail(self, stage, e):
+        """단계 하나가 예외로 끝나면 기록하고 파이프라인 전체를 멈춤 (다른 단계 / 시청자가 기다리지 않게)"""
+        print(f"스트림 {stage} 단계 오류: {e}")
+        with self.lock:
+            if self.error is None:
+                self.error = f"{stage}: {e}"
+        self.stop_event.set()
+
+    def _decode_loop(self):
+        cap = None
+        try:
+            # 업로드가 아직 진행 중이면 앞부분부터 읽음
+            cap = self.source() if callable(self.source) else open_video(self.source)
+            # speed 배속: skip_frames 의 배수 프레임만 디코딩 (건너뛰는 프레임은 grab / seek)
+            sampler = None if self.live else FrameSampler(cap, self.skip_frames)
+            self.sampler = sampler
+            frame_count = 0
+            while not self.stop_event.is_set():
+                t0 = time.perf_counter()
+                if sampler is None:
+                    ret, frame = cap.read()
+                else:
+                    sampler.step = self.skip_frames
+                    ret, frame = sampler.read()
+                if not ret:
+                    if self.live:
+                        continue  # 실시간 소스: 새 프레임이 없을 뿐 (재연결은 reader 가 처리)
+                    break
+                frame_count = frame_count + 1 if sampler is None else sampler.index
+
+                self._count("decoded", "decode", time.perf_counter() - t0)
+                if not self._put(self.decoded_q, (frame_count, frame), self.drop_decoded, "decoded"):
+                    break
+        except Exception as e:
+            self._fail("decode", e)
+        finally:
+            if cap is not None:
+                cap.release()
+            self._put(self.decoded_q, _END, False, "decoded")
+
+    def _process_loop(self):
+        try:
+            while True:
+                item = self._get(self.decoded_q)
+                if item is _END:
+                    break
+                frame_index, frame = item
+                t0 = time.perf_counter()
+                frame = self.process_fn(frame, frame_index)
+                self._count("processed", "process", time.perf_counter() - t0)
+                if not self._put(self.processed_q, frame, False, "processed"):
+                    break
+        except Exception as e:
+            self._fail("process", e)
+        finally:
+            self._put(self.processed_q, _END, False, "processed")
+
+    def _encode_loop(self):
+        try:
+            while True:
+                frame = self._get(self.processed_q)
+                if frame is _END:
+                    break
+                t0 = time.perf_counter()
+                data = self.encode_fn(frame)
+                self._count("encoded", "encode", time.perf_counter() - t0)
+                if not self._put(self.encoded_q, data, self.drop_encoded, "encoded"):
+                    break
+        except Exception as e:
+            self._fail("encode", e)
+        finally:
+            self._put(self.encoded_q, _END, False, "encoded")
+
+    # ---------------------------------------------
+    def start(self):
+        for target in (self._decode_loop, self._process_loop, self._encode_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join(timeout=1.0)
+
+    def frames(self):
+        """인코딩된 프레임을 순서대로 내보냄 (클라이언트 소비 속도와 디코딩이 분리됨)"""
+        try:
+            while True:
+                data = self._get(self.encoded_q)
+                if data is _END:
+                    break
+                with self.lock:
+                    self.stats["sent"] += 1
+                yield data
+        finally:
+            self.stop()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                **{k: v for k, v in self.stats.items() if not isinstance(v, dict)},
+                "dropped": dict(self.stats["dropped"]),
+                "stage_ms": {k: round(v, 2) for k, v in self.stats["stage_ms"].items()},
+                "queue_depth": {
+                    "decoded": self.decoded_q.qsize(),
+                    "processed": self.processed_q.qsize(),
+                    "encoded": self.encoded_q.qsize(),
+                },
+                "sampler": dict(self.sampler.stats) if self.sampler is not None else None,
+                "error": self.error,
+            }
+
+
+class FrameBroadcaster:
+    """한 번 인코딩된 프레임을 여러 구독자에게 나눠줌
+    구독자는 항상 최신 프레임만 받으므로 늦게 들어온 시청자도 현재 위치부터 보고,
+    느린 시청자는 중간 프레임을 건너뛴다 (다른 시청자나 분석에는 영향 없음).
+    건너뛴 프레임 수는 구독자별 / 전체로 집계한다."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest = None
+        self.seq = 0
+        self.closed = False
+        self.waiters = set()  # (event loop, asyncio.Event)
+        self.viewers = {}     # 구독자 번호 -> {"sent", "skipped"}
+        self.next_viewer = 0
+        self.skipped = 0      # 끝난 구독자 포함 전체 건너뛴 프레임
+
+    def publish(self, data):
+        with self.lock:
+            self.latest = data
+            self.seq += 1
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    @property
+    def subscribers(self):
+        return len(self.waiters)
+
+    async def subscribe(self):
+        """async generator: 새 프레임이 publish 될 때마다 최신 프레임을 내보냄"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.waiters.add(waiter)
+            last_seq = self.seq - 1 if self.latest is not None else self.seq
+            viewer_id = self.next_viewer
+            self.next_viewer += 1
+            viewer = self.viewers[viewer_id] = {"sent": 0, "skipped": 0}
+        try:
+            while True:
+                with self.lock:
+                    seq, data, closed = self.seq, self.latest, self.closed
+                    waiter[1].clear()
+                    if seq > last_seq and data is not None:
+                        # 이 구독자가 받지 못하고 지나간 프레임
+                        gap = seq - last_seq - 1
+                        viewer["skipped"] += gap
+                        viewer["sent"] += 1
+                        self.skipped += gap
+                if seq > last_seq and data is not None:
+                    last_seq = seq
+                    yield data
+                    continue
+                if closed:
+                    break
+                await waiter[1].wait()
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+                self.viewers.pop(viewer_id, None)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "published": self.seq,
+                "subscribers": len(self.waiters),
+                "skipped": self.skipped,
+                "viewers": [dict(v) for v in self.viewers.values()],
+            }
+
+
+class OccupancyFeed:
+    """슬롯 점유 상태(bool 배열) + 변경 순번, 변화만 구독자에게 밀어줌 (대시보드 폴링 대신 SSE 로 사용)
+    슬롯마다 마지막으로 바뀐 순번(changed_at)을 들고 있어서, 구독자는 자기가 받은 순번 이후에
+    바뀐 슬롯만 받는다. 느린 구독자는 여러 변화가 한 번의 delta 로 합쳐질 뿐 빠지는 변화는 없다.
+    조회용 응답(JSON / 비트맵)은 순번이 바뀔 때만 다시 만든다."""
+
+    def __init__(self, n_slots):
+        self.lock = threading.Lock()
+        self.state = np.zeros(n_slots, dtype=bool)
+        self.changed_at = np.zeros(n_slots, dtype=np.int64)
+        self.vehicles = 0
+        self.seq = 0
+        # 서버가 재시작되면 순번이 0 부터 다시 시작하므로 ETag 에 피드별 임의 값을 붙임
+        self.epoch = os.urandom(4).hex()
+        self.cache = {}  # 종류 -> (순번, 값)
+        self.waiters = set()  # (event loop, asyncio.Event)
+
+    def update(self, occupied, vehicles):
+        """처리한 프레임마다 호출, 점유 상태나 차량 수가 바뀌었을 때만 구독자를 깨움"""
+        occupied = np.asarray(occupied, dtype=bool)
+        with self.lock:
+            changed = occupied != self.state
+            if not changed.any() and vehicles == self.vehicles:
+                return False
+            self.seq += 1
+            self.changed_at[changed] = self.seq
+            self.state[changed] = occupied[changed]
+            self.vehicles = vehicles
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+        return True
+
+    def _counts(self):
+        total = len(self.state)
+        free = total - int(self.state.sum())
+        return {"seq": self.seq, "vehicles": self.vehicles, "total": total, "free": free}
+
+    def snapshot(self):
+        """전체 상태 (/parking_spaces 와 같은 spaces 형식)"""
+        with self.lock:
+            return {
+                **self._counts(),
+                "spaces": [{"id": idx+1, "occupied": int(o)} for idx, o in enumerate(self.state)],
+            }
+
+    @property
+    def etag(self):
+        return f'"{self.epoch}-{self.seq}"'
+
+    def _cached(self, kind, build):
+        with self.lock:
+            seq = self.seq
+            hit = self.cache.get(kind)
+            if hit is not None and hit[0] == seq:
+                return seq, hit[1]
+            value = build()
+            self.cache[kind] = (seq, value)
+            return seq, value
+
+    def result(self):
+        """기존 /parking_spaces 형식 -> (순번, dict)"""
+        return self._cached("result", lambda: {
+            "vehicles": [{"type": "car", "count": self.vehicles}],
+            "spaces": [{"id": idx+1, "occupied": int(o)} for idx, o in enumerate(self.state)],
+        })
+
+    def bitmap(self):
+        """점유 상태를 비트로 압축 (슬롯 id 1 = 첫 바이트의 최하위 비트) -> (순번, bytes)"""
+        return self._cached("bitmap", lambda: np.packbits(self.state, bitorder="little").tobytes())
+
+    def bitmap_json(self):
+        seq, bits = self.bitmap()
+        with self.lock:
+            counts = self._counts()
+        counts["seq"] = seq
+        return {**counts, "bitorder": "little", "bits": base64.b64encode(bits).decode("ascii")}
+
+    def delta(self, since):
+        """since 순번 이후 바뀐 슬롯만"""
+        with self.lock:
+            ids = np.nonzero(self.changed_at > since)[0]
+            return {
+                **self._counts(),
+                "changed": [{"id": int(idx)+1, "occupied": int(self.state[idx])} for idx in ids],
+            }
+
+    @property
+    def subscribers(self):
+        return len(self.waiters)
+
+    async def subscribe(self, keepalive=KEEPALIVE_SEC):
+        """async generator: 처음엔 ("snapshot", 전체 상태), 이후 변화가 있을 때마다 ("delta", 변화분)
+        keepalive 초 동안 변화가 없으면 (None, None) 을 내보냄 (연결 유지용)"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.waiters.add(waiter)
+        try:
+            message = self.snapshot()
+            last_seq = message["seq"]
+            yield "snapshot", message
+            while True:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None, None
+                    continue
+                waiter[1].clear()
+                message = self.delta(last_seq)
+                if message["seq"] == last_seq:
+                    continue
+                last_seq = message["seq"]
+                yield "delta", message
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+
+class AnalysisSession:
+    """업로드된 영상(또는 실시간 카메라) 하나에 대한 분석 세션
+    디코딩/추론/인코딩은 한 번만 하고 결과 프레임을 FrameBroadcaster 로 모든 시청자에게 전달
+    live=True 면 source 는 LatestFrameReader 이고, 카메라 속도 그대로 내보낸다"""
+
+    def __init__(self, source, process_fn, encode_fn, speed=1, stats_fn=None, live=False):
+        self.source = source
+        self.stats_fn = stats_fn
+        self.live = live
+        if live:
+            self.fps = source.get(cv2.CAP_PROP_FPS) or 30.0
+            pipeline_source = lambda: source
+        else:
+            cap = cv2.VideoCapture(source)
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.release()
+            pipeline_source = source
+
+        # 시청자가 없어도 분석은 진행되어야 하므로 프레임을 버리지 않고 재생 속도로 맞춤
+        # 실시간 소스는 추론이 밀리면 오래된 디코딩 프레임을 버리고 최신 프레임을 분석
+        self.pipeline = FramePipeline(pipeline_source, process_fn, encode_fn,
+                                      skip_frames=speed, drop_decoded=live,
+                                      drop_encoded=False, live=live)
+        self.broadcaster = FrameBroadcaster()
+        self.thread = None
+
+    @property
+    def speed(self):
+        return self.pipeline.skip_frames
+
+    def set_speed(self, speed):
+        self.pipeline.skip_frames = max(1, speed)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _pump(self):
+        interval = 1.0 / self.fps
+        next_time = time.perf_counter()
+        try:
+            for data in self.pipeline.frames():
+                if self.live:
+                    self.broadcaster.publish(data)
+                    continue
+                # 원본 FPS 간격으로 내보냄 (speed 배속은 디코더의 프레임 건너뛰기로 처리)
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time = max(next_time + interval, time.perf_counter() - interval)
+                self.broadcaster.publish(data)
+        finally:
+            self.broadcaster.close()
+
+    def start(self):
+        self.pipeline.start()
+        self.thread = threading.Thread(target=self._pump, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.pipeline.stop()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def snapshot(self):
+        pipeline = self.pipeline.snapshot()
+        broadcast = self.broadcaster.snapshot()
+        # 느린 시청자가 건너뛴 프레임도 버려진 프레임으로 집계
+        pipeline["dropped"]["viewers"] = broadcast["skipped"]
+        return {
+            **pipeline,
+            "speed": self.speed,
+            "subscribers": broadcast["subscribers"],
+            "published": broadcast["published"],
+            "broadcast": broadcast,
+            "running": self.running,
+            **(self.stats_fn() if self.stats_fn else {}),
+        }
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+from ai_module import load_slots
+from occupancy import SHARED_LABEL, SlotOccupancy, build_label_map
+
+CSV_PATH = "parking_slots.csv"
+
+
+def _frame_shape(slots):
+    pts = np.array(slots).reshape(-1, 2)
+    return int(pts[:, 1].max()) + 10, int(pts[:, 0].max()) + 10
+
+
+def test_label_map_matches_point_polygon_test():
+    """라벨 이미지의 모든 슬롯 픽셀이 pointPolygonTest >= 0 과 같아야 함"""
+    slots = load_slots(CSV_PATH)
+    h, w = _frame_shape(slots)
+    labels = build_label_map(slots, (h, w), mark_shared=True)
+
+    coverage = np.zeros((h, w), dtype=np.int32)
+    owner = np.zeros((h, w), dtype=np.int32)
+    for idx, pts in enumerate(slots):
+        contour = np.array(pts, dtype=np.int32)
+        x1, y1 = contour.min(axis=0)
+        x2, y2 = contour.max(axis=0)
+        for y in range(y1, y2 + 1):
+            for x in range(x1, x2 + 1):
+                if cv2.pointPolygonTest(contour, (x, y), False) >= 0:
+                    coverage[y, x] += 1
+                    owner[y, x] = idx + 1
+    expected = np.where(coverage > 1, SHARED_LABEL, owner)
+    assert np.array_equal(labels, expected)
+
+
+def test_label_occupancy_matches_polygon_engine():
+    slots = load_slots(CSV_PATH)
+    shape = _frame_shape(slots)
+    label_engine = SlotOccupancy(slots, use_label_map=True)
+    polygon_engine = SlotOccupancy(slots, use_index=False)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        centers = rng.uniform((0, 0), (shape[1], shape[0]), (200, 2))
+        half = rng.uniform(5, 30, (200, 2))
+        boxes = np.concatenate([centers - half, centers + half], axis=1)
+        assert np.array_equal(label_engine.occupancy(boxes, shape), polygon_engine.occupancy(boxes))
+
+
+def test_rules_agree_with_and_without_index():
+    """인덱스 유무 / 일부 슬롯 재판정과 관계없이 설정한 규칙으로 같은 결과"""
+    slots = load_slots(CSV_PATH)
+    shape = _frame_shape(slots)
+    rng = np.random.default_rng(1)
+    centers = rng.uniform((0, 0), (shape[1], shape[0]), (300, 2))
+    half = rng.uniform(10, 40, (300, 2))
+    boxes = np.concatenate([centers - half, centers + half], axis=1)
+    for rule in ("center", "iou", "overlap"):
+        dense = SlotOccupancy(slots, rule=rule, use_index=False)
+        indexed = SlotOccupancy(slots, rule=rule, use_index=True)
+        expected = indexed.occupancy(boxes)
+        assert np.array_equal(dense.occupancy(boxes), expected)
+        assert np.array_equal(dense.subset_occupancy(np.arange(len(slots)), boxes), expected)
+        assert np.array_equal(np.unique(dense.match(boxes)[0]), np.nonzero(expected)[0])
@@ -0,0 +1,80 @@
+import numpy as np
+
+CONFIRM_FRAMES = 3  # 같은 관측이 이 횟수만큼 연속으로 나와야 슬롯 상태를 바꿈
+
+
+class OccupancyTracker:
+    """슬롯별 점유 상태 머신 (히스테리시스)
+    감지 결과가 잠깐 튀어도 CONFIRM_FRAMES 번 연속 같은 결과가 나와야 상태가 바뀐다.
+    상태는 슬롯 수 길이의 배열로만 들고 있고, 감지 한 번마다 한 번에 갱신한다."""
+
+    def __init__(self, n_slots, confirm=CONFIRM_FRAMES):
+        self.confirm = confirm
+        self.state = np.zeros(n_slots, dtype=bool)           # 확정된 점유 상태
+        self.streak = np.zeros(n_slots, dtype=np.int16)      # 상태와 다른 관측 연속 횟수
+        self.last_change = np.zeros(n_slots, dtype=np.float64)
+        self.occupied_time = np.zeros(n_slots, dtype=np.float64)  # 끝난 주차의 누적 점유 시간
+        self.parks = np.zeros(n_slots, dtype=np.int32)       # 끝난 주차 횟수 (점유 -> 빈칸)
+        self.turnovers = np.zeros(n_slots, dtype=np.int32)   # 빈칸 -> 점유 전환 횟수
+        self.start_time = None
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.state)
+
+    @property
+    def pending(self):
+        """확정 전인 (상태와 다른 관측이 이어지는 중인) 슬롯 마스크"""
+        return self.streak > 0
+
+    def update(self, observed, t):
+        """관측된 점유 배열(observed)과 시각 t(초)로 갱신 -> 이번에 상태가 바뀐 슬롯 인덱스"""
+        observed = np.asarray(observed, dtype=bool)
+        self.updates += 1
+        if self.start_time is None:
+            # 첫 관측은 그대로 초기 상태로 사용
+            self.start_time = t
+            self.state[:] = observed
+            self.last_change[:] = t
+            return np.zeros(0, dtype=np.int64)
+
+        disagree = observed != self.state
+        self.streak = np.where(disagree, self.streak + 1, 0).astype(np.int16)
+        flipped = np.nonzero(self.streak >= self.confirm)[0]
+        if len(flipped) == 0:
+            return flipped
+
+        duration = t - self.last_change[flipped]
+        leaving = self.state[flipped]
+        # 점유 -> 빈칸: 주차 한 건 종료 / 빈칸 -> 점유: 회전 1회
+        self.occupied_time[flipped[leaving]] += duration[leaving]
+        self.parks[flipped[leaving]] += 1
+        self.turnovers[flipped[~leaving]] += 1
+
+        self.state[flipped] = ~self.state[flipped]
+        self.last_change[flipped] = t
+        self.streak[flipped] = 0
+        return flipped
+
+    def dwell(self, t):
+        """현재 상태가 유지된 시간 (초)"""
+        return np.maximum(t - self.last_change, 0)
+
+    def slot_stats(self, t):
+        """슬롯별 통계: 회전 수, 평균 주차 시간, 현재 상태 유지 시간, 점유율"""
+        dwell = self.dwell(t)
+        occupied_time = self.occupied_time + np.where(self.state, dwell, 0)
+        parks = self.parks + self.state.astype(np.int32)
+        avg_dwell = np.divide(occupied_time, parks, out=np.zeros_like(occupied_time), where=parks > 0)
+        elapsed = max(t - self.start_time, 1e-6) if self.start_time is not None else 1e-6
+
+        return {
+            idx + 1: {
+                "occupied": bool(self.state[idx]),
+                "turnovers": int(self.turnovers[idx]),
+                "avg_dwell_sec": round(float(avg_dwell[idx]), 1),
+                "current_dwell_sec": round(float(dwell[idx]), 1),
+                "occupancy_ratio": round(float(occupied_time[idx] / elapsed), 3),
+            }
+            for idx in range(len(self.state))
+        }
@@ -0,0 +1,57 @@
+import os
+from starlette.concurrency import run_in_threadpool
+from sources import uploading_marker
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 8 * 1024 ** 3))  # 업로드 최대 크기 (기본 8GB)
+EARLY_START_BYTES = 32 * 1024 ** 2  # start_early 일 때 이만큼 받으면 분석 시작
+
+
+class UploadError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def begin_upload(path):
+    """빈 파일 + 업로드 중 표시 파일 생성"""
+    open(path, "wb").close()
+    open(uploading_marker(path), "w").close()
+
+
+def finish_upload(path):
+    marker = uploading_marker(path)
+    if os.path.exists(marker):
+        os.remove(marker)
+
+
+def received_bytes(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+async def stream_to_file(chunks, path, offset=0, limit=MAX_UPLOAD_BYTES, on_progress=None):
+    """요청 본문 청크를 임시 사본 없이 바로 파일에 씀 (디스크 쓰기는 스레드풀에서)
+    offset: 이어 올리기 시작 위치 (현재 파일 크기와 같아야 함)
+    on_progress(받은 바이트 수): 청크마다 await 하는 코루틴 함수
+    -> 최종 파일 크기"""
+    current = received_bytes(path)
+    if offset != current:
+        raise UploadError(409, f"offset 불일치: 서버에 {current} 바이트가 있습니다.")
+
+    written = offset
+    f = await run_in_threadpool(open, path, "r+b" if os.path.exists(path) else "wb")
+    try:
+        await run_in_threadpool(f.seek, offset)
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            written += len(chunk)
+            if written > limit:
+                raise UploadError(413, f"업로드 크기 제한({limit} 바이트)을 넘었습니다.")
+            await run_in_threadpool(f.write, chunk)
+            if on_progress is not None:
+                await run_in_threadpool(f.flush)
+                await on_progress(written)
+    finally:
+        await run_in_threadpool(f.close)
+    return written
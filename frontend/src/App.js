@@ -21,7 +21,8 @@ function App() {
   const [remainingSlots, setRemainingSlots] = useState(44);
   const [congestionStatus, setCongestionStatus] = useState("원활");
 
-  const pollingRef = useRef(null);
+  const eventsRef = useRef(null);
+  const spacesRef = useRef([]);
 
   // 파일 선택
   const handleFileChange = (e) => {
@@ -47,14 +48,15 @@ function App() {
     setShowStream(false);
 
     try {
-      // 영상 업로드
-      const formData = new FormData();
-      formData.append("file", selectedFile);
-
-      const res = await fetch("http://localhost:8000/analyze", {
-        method: "POST",
-        body: formData,
-      });
+      // 영상 업로드 (파일 바이트를 그대로 전송 -> 서버에서 바로 작업 파일에 기록)
+      const res = await fetch(
+        `http://localhost:8000/analyze/stream?filename=${encodeURIComponent(selectedFile.name)}`,
+        {
+          method: "POST",
+          headers: { "Content-Type": "application/octet-stream" },
+          body: selectedFile,
+        }
+      );
 
       if (!res.ok) throw new Error("업로드 실패");
       await res.json();
@@ -62,8 +64,8 @@ function App() {
       // 스트림 보여주기
       setShowStream(true);
 
-      // 분석 결과 폴링 시작
-      startPolling();
+      // 분석 결과 구독 시작 (바뀐 슬롯만 받음)
+      startEvents();
     } catch (err) {
       console.error(err);
       alert("분석 중 오류 발생");
@@ -72,45 +74,52 @@ function App() {
     }
   };
 
-  const startPolling = () => {
-    if (pollingRef.current) clearInterval(pollingRef.current);
-
-    pollingRef.current = setInterval(async () => {
-      try {
-        // 전역 변수에 저장된 최신 값을 가져옴
-        const res = await fetch("http://localhost:8000/parking_spaces");
-        const data = await res.json();
-
-        // 차량 수
-        const vehicleCount = data.vehicles[0]?.count ?? 0;
-        setCarCount(vehicleCount);
-
-        // 슬롯 상태
-        const spaces = data.spaces;
-        setSlotShapes(spaces);
-
-        const emptySlots = spaces
-          .filter((s) => s.occupied === 0)
-          .map((s) => s.id);
-        setRemainingSlots(emptySlots.length);
-
-        setTotalSlots(spaces.length);
-        if (emptySlots.length / spaces.length <= 0.2)
-          setCongestionStatus("매우 혼잡");
-        else if (emptySlots.length / spaces.length <= 0.5)
-          setCongestionStatus("혼잡");
-        else setCongestionStatus("원활");
-
-        setAnalysisResult({ emptySlots });
-      } catch (err) {
-        console.error(err);
-      }
-    }, 500); // 1000 -> 500로 변경하여 반응 속도 높임
+  // 슬롯 목록 + 개수로 화면 상태 갱신
+  const applySpaces = (spaces, vehicleCount) => {
+    spacesRef.current = spaces;
+    setCarCount(vehicleCount);
+    setSlotShapes(spaces);
+
+    const emptySlots = spaces
+      .filter((s) => s.occupied === 0)
+      .map((s) => s.id);
+    setRemainingSlots(emptySlots.length);
+
+    setTotalSlots(spaces.length);
+    if (emptySlots.length / spaces.length <= 0.2)
+      setCongestionStatus("매우 혼잡");
+    else if (emptySlots.length / spaces.length <= 0.5)
+      setCongestionStatus("혼잡");
+    else setCongestionStatus("원활");
+
+    setAnalysisResult({ emptySlots });
+  };
+
+  // 폴링 대신 SSE 구독: 접속 시 전체 상태(snapshot), 이후 바뀐 슬롯만(delta)
+  const startEvents = () => {
+    if (eventsRef.current) eventsRef.current.close();
+
+    const source = new EventSource("http://localhost:8000/parking_spaces/events");
+    source.addEventListener("snapshot", (e) => {
+      const data = JSON.parse(e.data);
+      applySpaces(data.spaces, data.vehicles);
+    });
+    source.addEventListener("delta", (e) => {
+      const data = JSON.parse(e.data);
+      const changed = new Map(data.changed.map((s) => [s.id, s.occupied]));
+      const spaces = spacesRef.current.map((s) =>
+        changed.has(s.id) ? { ...s, occupied: changed.get(s.id) } : s
+      );
+      applySpaces(spaces, data.vehicles);
+    });
+    // 연결이 끊기면 EventSource 가 자동으로 다시 연결하고 snapshot 부터 다시 받음
+    source.onerror = (err) => console.error(err);
+    eventsRef.current = source;
   };
 
   useEffect(() => {
     return () => {
-      if (pollingRef.current) clearInterval(pollingRef.current);
+      if (eventsRef.current) eventsRef.current.close();
     };
   }, []);
 